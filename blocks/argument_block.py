@@ -9,6 +9,8 @@ from blocks.point import Point
 
 
 class ArgumentBlock(ConcreteBlock):
+    text_field = "code"
+
     def __init__(self):
         super(ArgumentBlock, self).__init__()
         self.status = BlockStatus.Argument
@@ -21,6 +23,26 @@ class ArgumentBlock(ConcreteBlock):
 
         return codes, indent
 
+    def validate(self):
+        problems = []
+        parent = self.back_block
+        if parent is None:
+            problems.append("Elem is not connected to any block")
+            return problems
+
+        if self.code.strip() == "":
+            if parent.elem_required:
+                problems.append("Elem is empty")
+            return problems
+
+        # 親 Block に埋め込んだ形で構文を確かめる
+        template, mode = parent.elem_syntax
+        try:
+            compile(template.format(self.code), "<elem>", mode)
+        except SyntaxError as e:
+            problems.append("Elem '" + self.code + "' is not valid Python: " + str(e.msg))
+        return problems
+
     def draw(self, x, y):
         length = 50
         frame_width = 3
@@ -40,12 +62,9 @@ class ArgumentBlock(ConcreteBlock):
         self.block_start_point = Point(x, y)
         self.block_end_point = Point(x, y - length)
 
-        text_input = TextInput(text=self.code, multiline=False)
+        text_input = TextInput(text=getattr(self, self.text_field), multiline=False)
         text_input.pos = (x + 10, y - length + 10)
         text_input.size = (length*2 - 20, length - 20)
         text_input.bind(text=self.on_text)
         self.add_widget(text_input)
         self.components.append(text_input)
-
-    def on_text(self, _, value):
-        self.code = value
@@ -1,7 +1,6 @@
 # coding: utf-8
 
 from kivy.graphics import Color, Rectangle
-from kivy.uix.label import Label
 from kivy.uix.textinput import TextInput
 
 from blocks.block_status import BlockStatus
@@ -10,6 +9,8 @@ from blocks.point import Point
 
 
 class CallBlock(ConcreteBlock):
+    text_field = "name"
+
     def __init__(self):
         super(CallBlock, self).__init__()
         self.status = BlockStatus.Call
@@ -20,10 +21,16 @@ class CallBlock(ConcreteBlock):
         pass
 
     def make_code(self, codes, indent):
-        codes += "    " * indent + self.name + "()"
+        codes += "    " * indent + self.name + "()\n"
 
         return codes, indent
 
+    def validate(self):
+        problems = []
+        if self.name.strip() == "":
+            problems.append("Call has no function name")
+        return problems
+
     def draw(self, x, y):
         length = 50
         frame_width = 3
@@ -43,19 +50,11 @@ class CallBlock(ConcreteBlock):
         self.block_start_point = Point(x, y)
         self.block_end_point = Point(x, y - length)
 
-        label = Label(text="Call")
-        label.color = (0, 0, 0, 1)
-        label.pos = (x + 10, y - length + 10)
-        label.size = (length*2 - 20, length - 20)
-        self.add_widget(label)
-        self.components.append(label)
+        self.draw_label("Call", x + 10, y - length + 10, length*2 - 20, length - 20)
 
-        text_input = TextInput(text=self.code, multiline=False)
+        text_input = TextInput(text=getattr(self, self.text_field), multiline=False)
         text_input.pos = (x + 100, y - length + 10)
         text_input.size = (length*2 - 20, length - 20)
         text_input.bind(text=self.on_text)
         self.add_widget(text_input)
         self.components.append(text_input)
-
-    def on_text(self, _, value):
-        self.name = value
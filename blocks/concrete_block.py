@@ -2,6 +2,10 @@
 
 from abc import ABCMeta, abstractmethod
 
+from kivy.clock import Clock
+from kivy.core.text import Label as CoreLabel
+from kivy.graphics import Color, Rectangle
+from kivy.metrics import sp
 from kivy.uix.widget import Widget
 
 from blocks.abstract_block import AbstractBlock
@@ -13,6 +17,14 @@ class ConcreteBlock(AbstractBlock, Widget):
     __metaclass__ = ABCMeta
 
     can_touch = True  # Block に mouse click 可能か
+    line_table = None  # code 生成中の 行番号 -> Block 対応表
+    label_textures = {}  # 文字列 -> Label の texture. 全 tab で共有する
+    text_field = None  # TextInput で編集する属性名
+    port_kinds = ()  # 他の Block を繋げられる接続点の種類 ("next", "elem", "nest")
+    elem_required = False  # 引数 Block が空ではいけないか
+    elem_syntax = ("{0}", "eval")  # 引数 Block の構文を確かめる雛形と compile の mode
+    # 強調表示の目的. 重なったときは先のものを表示する
+    mark_order = ("snap", "pause", "selection", "error", "trace", "breakpoint")
 
     def __init__(self):
         super(ConcreteBlock, self).__init__()
@@ -30,40 +42,73 @@ class ConcreteBlock(AbstractBlock, Widget):
 
         self.is_touched = False  # Block が mouse click されているか
         self.mouse_start_point = None  # mouse drag の始点
+        self.pending_move = (0, 0)  # 次の frame でまとめて動かす量
+        self.move_trigger = None
+        self.on_drag = None  # drag で動いた frame ごとの callback
+
+        self.dirty = True  # 検査結果が古くなっているか
+        self.breakpoint = False  # debug 実行時にここで止まるか
+
+        self.block_id = None  # 共同編集で Block を識別する id
+        self.on_edit = None  # 文字列が編集されたときの callback
+        self.marks = {}  # 目的 -> 強調表示の色
+        self.mark_color = None  # 強調表示の色
+        self.mark_rect = None  # 強調表示の矩形
+
+    def draw_label(self, text, x, y, width, height):
+        # Label Widget の代わりに共有 texture を中央に描画する
+        texture = ConcreteBlock.label_textures.get(text)
+        if texture is None:
+            label = CoreLabel(text=text, font_size=sp(15), color=(0, 0, 0, 1))
+            label.refresh()
+            texture = label.texture
+            ConcreteBlock.label_textures[text] = texture
+
+        with self.canvas:
+            Color(1, 1, 1)
+            self.components.append(
+                Rectangle(texture=texture, size=texture.size,
+                          pos=(x + (width - texture.width) / 2, y + (height - texture.height) / 2))
+            )
+
+    def on_text(self, _, value):
+        setattr(self, self.text_field, value)
+        self.dirty = True
+
+        if self.on_edit is not None:
+            self.on_edit(self)
+
+    def translate(self, dx, dy):
+        # 接続している Block は動かさず, この Block だけを (dx, dy) 分移動する
+        for component in self.components:
+            # float型にcastしないと以下のerror messageが発生する
+            # ValueError: Label.x have an invalid format
+            x, y = float(component.pos[0] - dx), float(component.pos[1] - dy)
+
+            component.pos = (x, y)
+
+        # blockの始点と終点の更新
+        self.block_start_point -= Point(dx, dy)
+        self.block_end_point -= Point(dx, dy)
+
+        if self.status in [BlockStatus.Function, BlockStatus.Nest, BlockStatus.Declare]:
+            self.block_elem_point -= Point(dx, dy)
+
+        if self.status == BlockStatus.Nest:
+            self.block_nest_point -= Point(dx, dy)
+            self.block_bar_point -= Point(dx, dy)
 
     def move(self, dx, dy):
         block = self
         while block is not None:
-            # blockのcomponentを(dx, dy)分移動する
-            for component in block.components:
-                # float型にcastしないと以下のerror messageが発生する
-                # ValueError: Label.x have an invalid format
-                x, y = float(component.pos[0] - dx), float(component.pos[1] - dy)
-
-                component.pos = (x, y)
-
-            # blockの始点と終点の更新
-            block.block_start_point -= Point(dx, dy)
-            block.block_end_point -= Point(dx, dy)
+            block.translate(dx, dy)
 
             # 関数, 入れ子型Blockの, 引数Blockについての処理
             if block.status in [BlockStatus.Function, BlockStatus.Nest, BlockStatus.Declare]:
-                block.block_elem_point -= Point(dx, dy)
-
                 if block.elem_block is not None:
-                    elem_block = block.elem_block
-
-                    for component in elem_block.components:
-                        x, y = float(component.pos[0] - dx), float(component.pos[1] - dy)
-                        component.pos = (x, y)
-
-                    elem_block.block_start_point -= Point(dx, dy)
-                    elem_block.block_end_point -= Point(dx, dy)
+                    block.elem_block.translate(dx, dy)
 
             if block.status == BlockStatus.Nest:
-                block.block_nest_point -= Point(dx, dy)
-                block.block_bar_point -= Point(dx, dy)
-
                 if block.nest_block is not None:
                     block.nest_block.move(dx, dy)
 
@@ -73,6 +118,105 @@ class ConcreteBlock(AbstractBlock, Widget):
         self.next_block = None
         self.back_block = None
 
+    @staticmethod
+    def make_chain_code(block, codes, indent):
+        # block から next_block を辿って code を生成する
+        while block is not None:
+            if ConcreteBlock.line_table is not None:
+                ConcreteBlock.line_table[codes.count("\n") + 1] = block
+            codes, indent = block.make_code(codes, indent)
+            block = block.next_block
+
+        return codes, indent
+
+    @staticmethod
+    def find_heads(codes):
+        # 各 chain の先頭 Block. 単独の引数 Block は chain にならない
+        return [block for block in codes
+                if block.back_block is None and block.status != BlockStatus.Argument]
+
+    def connection(self):
+        # 接続状況. 変化したら検査し直す
+        return (self.next_block, self.back_block,
+                getattr(self, "elem_block", None), getattr(self, "nest_block", None))
+
+    def chain_blocks(self):
+        # self 以降に接続している Block をすべて返す
+        blocks = []
+        stack = [self]
+        while stack:
+            block = stack.pop()
+            blocks.append(block)
+            for child in (block.next_block, getattr(block, "elem_block", None),
+                          getattr(block, "nest_block", None)):
+                if child is not None:
+                    stack.append(child)
+        return blocks
+
+    def port_point(self, kind):
+        if kind == "next":
+            return self.block_end_point
+        return getattr(self, "block_" + kind + "_point")
+
+    def open_ports(self, ignore=None):
+        # まだ何も繋がっていない (ignore だけが繋がっている) 接続点の (種類, 座標)
+        return [(kind, self.port_point(kind)) for kind in self.port_kinds
+                if getattr(self, kind + "_block") in (None, ignore)]
+
+    @staticmethod
+    def accepts(kind, block):
+        # 引数 Block は elem にだけ, それ以外は next, nest にだけ繋がる
+        return (kind == "elem") == (block.status == BlockStatus.Argument)
+
+    def attach(self, kind, block):
+        # block を接続点 kind まで動かして繋ぐ
+        dx, dy = (block.block_start_point - self.port_point(kind)).point
+        block.move(dx, dy)
+        setattr(self, kind + "_block", block)
+        block.back_block = self
+
+    def detach(self, block):
+        # 子の block との接続を切る
+        for kind in self.port_kinds:
+            if getattr(self, kind + "_block") is block:
+                setattr(self, kind + "_block", None)
+        block.back_block = None
+
+    def validate(self):
+        # 実行前に検出できる問題点のリストを返す
+        return []
+
+    def mark(self, purpose, color):
+        # Block を purpose ("snap", "error" など) のために color (r, g, b, a) で強調表示する. None なら解除
+        # 他の目的の強調表示は残し, mark_order で最も先のものを表示する
+        if color is None:
+            self.marks.pop(purpose, None)
+        else:
+            self.marks[purpose] = color
+        color = next((self.marks[kind] for kind in self.mark_order if kind in self.marks), None)
+
+        if self.mark_rect is None:
+            if color is None or not self.components:
+                return
+
+            frame = self.components[0]
+            with self.canvas.after:
+                self.mark_color = Color(*color)
+                self.mark_rect = Rectangle(pos=frame.pos, size=frame.size)
+            self.components.append(self.mark_rect)
+        elif color is None:
+            self.mark_color.a = 0
+        else:
+            self.mark_color.rgba = color
+
+    def bounding_box(self):
+        # Block の components 全体を囲む矩形 (x0, y0, x1, y1)
+        x0 = min(component.pos[0] for component in self.components)
+        y0 = min(component.pos[1] for component in self.components)
+        x1 = max(component.pos[0] + component.size[0] for component in self.components)
+        y1 = max(component.pos[1] + component.size[1] for component in self.components)
+        return x0, y0, x1, y1
+
     def is_in_block(self, touch):
         for component in self.components:
             if (component.pos[0] <= touch.pos[0] <= component.pos[0] + component.size[0]
@@ -86,19 +230,35 @@ class ConcreteBlock(AbstractBlock, Widget):
                 self.is_touched = True
                 ConcreteBlock.can_touch = False
                 self.mouse_start_point = touch.pos
+                if self.move_trigger is None:
+                    self.move_trigger = Clock.create_trigger(self.apply_pending_move)
 
         return super(ConcreteBlock, self).on_touch_down(touch)
 
     def on_touch_move(self, touch):
         if self.is_touched:
+            # 移動量を貯めておき, frame ごとに 1 回だけ move する
             dx, dy = self.mouse_start_point[0] - touch.pos[0], self.mouse_start_point[1] - touch.pos[1]
-            self.move(dx, dy)
+            self.pending_move = (self.pending_move[0] + dx, self.pending_move[1] + dy)
             self.mouse_start_point = touch.pos
+            self.move_trigger()
 
         return super(ConcreteBlock, self).on_touch_move(touch)
 
+    def apply_pending_move(self, *args):
+        dx, dy = self.pending_move
+        if dx == 0 and dy == 0:
+            return
+        self.pending_move = (0, 0)
+        self.move(dx, dy)
+
+        if self.on_drag is not None and self.is_touched:
+            self.on_drag(self)
+
     def on_touch_up(self, touch):
         if self.is_touched:
+            self.move_trigger.cancel()
+            self.apply_pending_move()
             self.is_touched = False
             ConcreteBlock.can_touch = True
 
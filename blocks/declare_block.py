@@ -2,7 +2,6 @@
 
 from kivy.graphics import Color, Rectangle
 from kivy.uix.textinput import TextInput
-from kivy.uix.label import Label
 
 from blocks import DISTANCE_RANGE
 from blocks.block_status import BlockStatus
@@ -11,6 +10,11 @@ from blocks.point import Point
 
 
 class DeclareBlock(ConcreteBlock):
+    text_field = "name"
+    port_kinds = ("next", "elem")
+    elem_required = True
+    elem_syntax = ("_ = {0}", "exec")
+
     def __init__(self):
         super(DeclareBlock, self).__init__()
         self.status = BlockStatus.Declare
@@ -29,6 +33,16 @@ class DeclareBlock(ConcreteBlock):
 
         return codes, indent
 
+    def validate(self):
+        problems = []
+        if self.name.strip() == "":
+            problems.append("Variable has no name")
+        elif not self.name.isidentifier():
+            problems.append("Variable name '" + self.name + "' is not an identifier")
+        if self.elem_block is None:
+            problems.append("Variable has no value")
+        return problems
+
     def connect_block(self, block):
         if self.can_connect_next(block):
             dx, dy = (block.block_start_point - self.block_end_point).point
@@ -64,6 +78,10 @@ class DeclareBlock(ConcreteBlock):
         else:
             return False
 
+    def initialize_connect(self):
+        super(DeclareBlock, self).initialize_connect()
+        self.elem_block = None
+
     def draw(self, x, y):
         length = 50
         frame_width = 3
@@ -84,19 +102,11 @@ class DeclareBlock(ConcreteBlock):
         self.block_end_point = Point(x, y - length)
         self.block_elem_point = Point(x + length*4, y)
 
-        text_input = TextInput(text=self.code, multiline=False)
+        text_input = TextInput(text=getattr(self, self.text_field), multiline=False)
         text_input.pos = (x + 100, y - length + 10)
         text_input.size = (length*2 - 20, length - 20)
         text_input.bind(text=self.on_text)
         self.add_widget(text_input)
         self.components.append(text_input)
 
-        label = Label(text="Declare")
-        label.color = (0, 0, 0, 1)
-        label.pos = (x + 10, y - length + 10)
-        label.size = (length*2 - 20, length - 20)
-        self.add_widget(label)
-        self.components.append(label)
-
-    def on_text(self, _, value):
-        self.name = value
+        self.draw_label("Declare", x + 10, y - length + 10, length*2 - 20, length - 20)
@@ -3,7 +3,6 @@
 from abc import ABCMeta, abstractmethod
 
 from kivy.graphics import Color, Rectangle
-from kivy.uix.label import Label
 
 from blocks import DISTANCE_RANGE
 from blocks.block_status import BlockStatus
@@ -14,6 +13,8 @@ from blocks.point import Point
 class FunctionBlock(ConcreteBlock):
     __metaclass__ = ABCMeta
 
+    port_kinds = ("next", "elem")
+
     def __init__(self):
         super(FunctionBlock, self).__init__()
         self.status = BlockStatus.Function
@@ -69,6 +70,8 @@ class FunctionBlock(ConcreteBlock):
 
 
 class PrintBlock(FunctionBlock):
+    elem_syntax = ("print({0})", "eval")
+
     def __init__(self):
         super(PrintBlock, self).__init__()
         self.code = "print"
@@ -103,9 +106,4 @@ class PrintBlock(FunctionBlock):
         self.block_end_point = Point(x, y - length)
         self.block_elem_point = Point(x + length*2, y)
 
-        label = Label(text="Print")
-        label.color = (0, 0, 0, 1)
-        label.pos = (x + 10, y - length + 10)
-        label.size = (length*2 - 20, length - 20)
-        self.add_widget(label)
-        self.components.append(label)
+        self.draw_label("Print", x + 10, y - length + 10, length*2 - 20, length - 20)
@@ -3,7 +3,6 @@
 from abc import ABCMeta, abstractmethod
 
 from kivy.graphics import Color, Rectangle
-from kivy.uix.label import Label
 from kivy.uix.textinput import TextInput
 
 from blocks import DISTANCE_RANGE
@@ -15,6 +14,8 @@ from blocks.point import Point
 class NestBlock(ConcreteBlock):
     __metaclass__ = ABCMeta
 
+    port_kinds = ("next", "elem", "nest")
+
     def __init__(self):
         super(NestBlock, self).__init__()
         self.status = BlockStatus.Nest
@@ -83,8 +84,15 @@ class NestBlock(ConcreteBlock):
 
     def initialize_connect(self):
         super(NestBlock, self).initialize_connect()
+        self.elem_block = None
         self.nest_block = None
 
+    def validate(self):
+        problems = []
+        if self.nest_block is None:
+            problems.append(self.code.capitalize() + " has no body")
+        return problems
+
     @abstractmethod
     def make_code(self, codes, indent):
         return NotImplementedError()
@@ -94,6 +102,13 @@ class NestBlock(ConcreteBlock):
         return NotImplementedError()
 
     def update(self):
+        distance = self.update_bar()
+
+        if self.next_block is not None:
+            self.next_block.move(distance.x, distance.y)
+
+    def update_bar(self):
+        # 入れ子内の Block 数に合わせて bar を伸縮し, 終点の移動量を返す
         length = 50
         nest_block = self.nest_block
         while nest_block is not None:
@@ -107,11 +122,13 @@ class NestBlock(ConcreteBlock):
         distance = self.block_end_point - Point(self.end.pos[0], self.end.pos[1])
         self.block_end_point = Point(self.end.pos[0], self.end.pos[1])
 
-        if self.next_block is not None:
-            self.next_block.move(distance.x, distance.y)
+        return distance
 
 
 class IfBlock(NestBlock):
+    elem_required = True
+    elem_syntax = ("if {0}: pass", "exec")
+
     def __init__(self):
         super(IfBlock, self).__init__()
         self.code = "if"
@@ -132,14 +149,17 @@ class IfBlock(NestBlock):
 
         indent += 1
         # ここでif文中のcodeを実行
-        next_block = self.nest_block
-        while next_block is not None:
-            codes, indent = next_block.make_code(codes, indent)
-            next_block = next_block.next_block
+        codes, indent = self.make_chain_code(self.nest_block, codes, indent)
         indent -= 1
 
         return codes, indent
 
+    def validate(self):
+        problems = super(IfBlock, self).validate()
+        if self.elem_block is None:
+            problems.append("If has no condition")
+        return problems
+
     def draw(self, x, y):
         length = 50
         frame_width = 3
@@ -167,15 +187,13 @@ class IfBlock(NestBlock):
         self.block_nest_point = Point(x + length/3, y - length)
         self.block_bar_point = Point(x, y - length)
 
-        label = Label(text="If")
-        label.color = (0, 0, 0, 1)
-        label.pos = (x + 10, y - length + 10)
-        label.size = (length*2 - 20, length - 20)
-        self.add_widget(label)
-        self.components.append(label)
+        self.draw_label("If", x + 10, y - length + 10, length*2 - 20, length - 20)
 
 
 class ClassBlock(NestBlock):
+    elem_required = True
+    elem_syntax = ("class {0}: pass", "exec")
+
     def __init__(self):
         super(ClassBlock, self).__init__()
         self.code = "class"
@@ -196,14 +214,17 @@ class ClassBlock(NestBlock):
 
         indent += 1
         # ここで入れ子のcodeを実行
-        next_block = self.nest_block
-        while next_block is not None:
-            codes, indent = next_block.make_code(codes, indent)
-            next_block = next_block.next_block
+        codes, indent = self.make_chain_code(self.nest_block, codes, indent)
         indent -= 1
 
         return codes, indent
 
+    def validate(self):
+        problems = super(ClassBlock, self).validate()
+        if self.elem_block is None:
+            problems.append("Class has no name")
+        return problems
+
     def draw(self, x, y):
         length = 50
         frame_width = 3
@@ -234,18 +255,16 @@ class ClassBlock(NestBlock):
         self.block_nest_point = Point(x + length/3, y - length)
         self.block_bar_point = Point(x, y - length)
 
-        label = Label(text="Class")
-        label.color = (0, 0, 0, 1)
-        label.pos = (x + 10, y - length + 10)
-        label.size = (length*2 - 20, length - 20)
-        self.add_widget(label)
-        self.components.append(label)
+        self.draw_label("Class", x + 10, y - length + 10, length*2 - 20, length - 20)
 
 
 class DefineBlock(NestBlock):
+    text_field = "name"
+    elem_syntax = ("def f({0}): pass", "exec")
+
     def __init__(self):
         super(DefineBlock, self).__init__()
-        self.code = "class"
+        self.code = "def"
 
         self.name = ""  # 関数名
 
@@ -262,14 +281,19 @@ class DefineBlock(NestBlock):
 
         indent += 1
         # ここで入れ子のcodeを実行
-        next_block = self.nest_block
-        while next_block is not None:
-            codes, indent = next_block.make_code(codes, indent)
-            next_block = next_block.next_block
+        codes, indent = self.make_chain_code(self.nest_block, codes, indent)
         indent -= 1
 
         return codes, indent
 
+    def validate(self):
+        problems = super(DefineBlock, self).validate()
+        if self.name.strip() == "":
+            problems.append("Define has no function name")
+        elif not self.name.isidentifier():
+            problems.append("Function name '" + self.name + "' is not an identifier")
+        return problems
+
     def draw(self, x, y):
         length = 50
         frame_width = 3
@@ -300,7 +324,7 @@ class DefineBlock(NestBlock):
         self.block_nest_point = Point(x + length/3, y - length)
         self.block_bar_point = Point(x, y - length)
 
-        text_input = TextInput(text=self.name, multiline=False)
+        text_input = TextInput(text=getattr(self, self.text_field), multiline=False)
         text_input.pos = (x + 100, y - length + 10)
         text_input.size = (length*2 - 20, length - 20)
         text_input.bind(text=self.on_text)
@@ -308,12 +332,4 @@ class DefineBlock(NestBlock):
         self.add_widget(text_input)
         self.components.append(text_input)
 
-        label = Label(text="define")
-        label.color = (0, 0, 0, 1)
-        label.pos = (x + 10, y - length + 10)
-        label.size = (length*2 - 20, length - 20)
-        self.add_widget(label)
-        self.components.append(label)
-
-    def on_text(self, _, value):
-        self.name = value
+        self.draw_label("define", x + 10, y - length + 10, length*2 - 20, length - 20)
@@ -0,0 +1,99 @@
+# coding: utf-8
+
+import math
+from collections import defaultdict
+
+from blocks import DISTANCE_RANGE
+
+
+class PortIndex:
+    # 接続点を DISTANCE_RANGE 四方の格子に登録し, 近くの格子だけを探す
+    # 接続点が空いているかは探すときに調べるので, 位置が変わったときだけ更新すればよい
+    def __init__(self):
+        self.cells = defaultdict(set)  # 格子 -> {(Block, 種類)}
+        self.block_cells = {}  # Block -> [(格子, 種類)]
+        self.start_cells = defaultdict(set)  # 格子 -> 始点がその格子にある Block
+        self.block_starts = {}  # Block -> 始点の格子
+
+    @staticmethod
+    def cell_of(point):
+        return int(math.floor(point.x / DISTANCE_RANGE)), int(math.floor(point.y / DISTANCE_RANGE))
+
+    def update(self, block):
+        self.remove(block)
+
+        entries = []
+        for kind in block.port_kinds:
+            cell = self.cell_of(block.port_point(kind))
+            self.cells[cell].add((block, kind))
+            entries.append((cell, kind))
+        self.block_cells[block] = entries
+
+        cell = self.cell_of(block.block_start_point)
+        self.start_cells[cell].add(block)
+        self.block_starts[block] = cell
+
+    def remove(self, block):
+        for cell, kind in self.block_cells.pop(block, ()):
+            self.cells[cell].discard((block, kind))
+            if not self.cells[cell]:
+                del self.cells[cell]
+
+        cell = self.block_starts.pop(block, None)
+        if cell is not None:
+            self.start_cells[cell].discard(block)
+            if not self.start_cells[cell]:
+                del self.start_cells[cell]
+
+    def clear(self):
+        self.cells = defaultdict(set)
+        self.block_cells = {}
+        self.start_cells = defaultdict(set)
+        self.block_starts = {}
+
+    def nearest(self, block, exclude=()):
+        # block の始点から DISTANCE_RANGE 以内で最も近い, 繋げられる接続点 (Block, 種類)
+        # exclude の Block の接続点は除く
+        cx, cy = self.cell_of(block.block_start_point)
+
+        nearest = None
+        nearest_distance = DISTANCE_RANGE
+        for x in (cx - 1, cx, cx + 1):
+            for y in (cy - 1, cy, cy + 1):
+                for parent, kind in self.cells.get((x, y), ()):
+                    if parent is block or parent in exclude:
+                        continue
+                    if getattr(parent, kind + "_block") not in (None, block):
+                        continue
+                    if not parent.accepts(kind, block):
+                        continue
+
+                    distance = (block.block_start_point - parent.port_point(kind)).norm()
+                    if distance < nearest_distance:
+                        nearest = (parent, kind)
+                        nearest_distance = distance
+
+        return nearest
+
+    def nearest_child(self, parent, kind, exclude=()):
+        # parent の接続点 kind から DISTANCE_RANGE 以内で最も近い, まだどこにも繋がっていない Block
+        # exclude の Block は除く
+        point = parent.port_point(kind)
+        cx, cy = self.cell_of(point)
+
+        nearest = None
+        nearest_distance = DISTANCE_RANGE
+        for x in (cx - 1, cx, cx + 1):
+            for y in (cy - 1, cy, cy + 1):
+                for block in self.start_cells.get((x, y), ()):
+                    if block is parent or block in exclude or block.back_block is not None:
+                        continue
+                    if not parent.accepts(kind, block):
+                        continue
+
+                    distance = (block.block_start_point - point).norm()
+                    if distance < nearest_distance:
+                        nearest = block
+                        nearest_distance = distance
+
+        return nearest
@@ -0,0 +1,70 @@
+# coding: utf-8
+
+from blocks.argument_block import ArgumentBlock
+from blocks.block_status import BlockStatus
+from blocks.call_block import CallBlock
+from blocks.declare_block import DeclareBlock
+from blocks.function_block import PrintBlock
+from blocks.nest_block import IfBlock, ClassBlock, DefineBlock
+
+BLOCK_TYPES = {
+    block_type.__name__: block_type
+    for block_type in (PrintBlock, IfBlock, ClassBlock, DefineBlock,
+                       ArgumentBlock, DeclareBlock, CallBlock)
+}
+
+
+def dump_blocks(codes):
+    # Block の list を JSON に変換できる dict にする
+    # codes に含まれない Block への接続は保存しない
+    index = {block: i for i, block in enumerate(codes)}
+
+    data = []
+    for block in codes:
+        data.append({
+            "type": type(block).__name__,
+            "x": float(block.block_start_point.x) if block.block_start_point is not None else 0.0,
+            "y": float(block.block_start_point.y) if block.block_start_point is not None else 0.0,
+            "text": getattr(block, block.text_field) if block.text_field is not None else "",
+            "next": index.get(block.next_block),
+            "elem": index.get(getattr(block, "elem_block", None)),
+            "nest": index.get(getattr(block, "nest_block", None)),
+            "breakpoint": block.breakpoint,
+            "id": block.block_id,
+        })
+
+    return {"blocks": data}
+
+
+def load_blocks(data, draw=True, dx=0, dy=0):
+    # dump_blocks の結果から Block を作り直す
+    # draw=False なら描画せず, code 生成だけに使える Block を返す
+    codes = []
+    for item in data["blocks"]:
+        block = BLOCK_TYPES[item["type"]]()
+        if block.text_field is not None:
+            setattr(block, block.text_field, item.get("text", ""))
+        block.breakpoint = item.get("breakpoint", False)
+        block.block_id = item.get("id")
+        if draw:
+            block.draw(item["x"] + dx, item["y"] + dy)
+        codes.append(block)
+
+    for block, item in zip(codes, data["blocks"]):
+        if item.get("next") is not None:
+            block.next_block = codes[item["next"]]
+            block.next_block.back_block = block
+        if item.get("elem") is not None:
+            block.elem_block = codes[item["elem"]]
+            block.elem_block.back_block = block
+        if item.get("nest") is not None:
+            block.nest_block = codes[item["nest"]]
+            block.nest_block.back_block = block
+
+    # 保存時の位置は伸縮後のものなので, bar だけを合わせる
+    if draw:
+        for block in codes:
+            if block.status == BlockStatus.Nest:
+                block.update_bar()
+
+    return codes
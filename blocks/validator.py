@@ -0,0 +1,26 @@
+# coding: utf-8
+
+
+class Validator:
+    def __init__(self):
+        self.diagnostics = {}  # Block -> 問題点のリスト
+
+    def validate(self, codes):
+        # dirty な Block のみ検査し直す
+        for block in codes:
+            if block.dirty or block not in self.diagnostics:
+                self.diagnostics[block] = block.validate()
+                block.dirty = False
+
+        return [(block, self.diagnostics[block]) for block in codes if self.diagnostics[block]]
+
+    def clear(self):
+        self.diagnostics = {}
+
+    @staticmethod
+    def format(diagnostics):
+        lines = []
+        for block, problems in diagnostics:
+            for problem in problems:
+                lines.append(type(block).__name__ + ": " + problem)
+        return "\n".join(lines)
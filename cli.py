@@ -0,0 +1,121 @@
+# coding: utf-8
+
+import os
+import sys
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# window を作らず, Kivy に引数を解釈させない
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+os.environ.setdefault("KIVY_NO_CONSOLELOG", "1")
+
+from blocks.concrete_block import ConcreteBlock
+from blocks.serializer import load_blocks
+from blocks.validator import Validator
+from executor import execute_script
+from exporter import compile_error, export_module
+
+
+def compile_program(path):
+    # 保存された program を読み込み, chain ごとの code と問題点を返す
+    with open(path) as f:
+        codes = load_blocks(json.load(f), draw=False)
+
+    diagnostics = Validator().validate(codes)
+    scripts = [ConcreteBlock.make_chain_code(head, "", 0)[0]
+               for head in ConcreteBlock.find_heads(codes)]
+
+    return scripts, Validator.format(diagnostics)
+
+
+def _execute(job):
+    script, timeout = job
+    return execute_script(script, timeout)
+
+
+def command_compile(args):
+    # 問題のある program があれば 1 を返す
+    status = 0
+    for path in args.programs:
+        scripts, errors = compile_program(path)
+        if errors:
+            sys.stderr.write(path + "\n" + errors + "\n")
+            status = 1
+
+        code = "\n".join(scripts)
+        if args.out_dir is None:
+            # 複数の program を区別できるよう見出しを付ける
+            sys.stdout.write("# === " + path + " ===\n")
+            sys.stdout.write(code if code.endswith("\n") or not code else code + "\n")
+        else:
+            name = os.path.splitext(os.path.basename(path))[0]
+            error = compile_error(export_module(code, args.out_dir, name))
+            if error is not None:
+                sys.stderr.write(error + "\n")
+                status = 1
+
+    return status
+
+
+def command_run(args):
+    # compile は main process で行い, 実行だけを process pool に任せる
+    # 問題のある program, error か時間切れになった chain があれば 1 を返す
+    status = 0
+    programs = []
+    jobs = []
+    for path in args.programs:
+        scripts, errors = compile_program(path)
+        if errors and not args.force:
+            programs.append((path, scripts, errors, 0))
+            continue
+        programs.append((path, scripts, errors, len(scripts)))
+        jobs.extend((script, args.timeout) for script in scripts)
+
+    output = sys.stdout if args.output is None else open(args.output, "w")
+    try:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = pool.map(_execute, jobs, chunksize=args.chunksize)
+
+            for path, scripts, errors, count in programs:
+                record = {"program": path, "errors": errors, "chains": []}
+                if errors:
+                    status = 1
+                for script in scripts[:count]:
+                    result = next(results)
+                    result["code"] = script
+                    record["chains"].append(result)
+                    if result["error"] or result["timeout"]:
+                        status = 1
+                output.write(json.dumps(record) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile and run saved block programs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compile_parser = subparsers.add_parser("compile", help="print or write the generated Python code")
+    compile_parser.add_argument("programs", nargs="+", help="programs saved as JSON")
+    compile_parser.add_argument("--out-dir", help="write <name>.py and its bytecode here instead of stdout")
+    compile_parser.set_defaults(func=command_compile)
+
+    run_parser = subparsers.add_parser("run", help="execute programs and write JSON Lines results")
+    run_parser.add_argument("programs", nargs="+", help="programs saved as JSON")
+    run_parser.add_argument("--jobs", type=int, default=None, help="number of worker processes")
+    run_parser.add_argument("--timeout", type=float, default=5.0, help="seconds allowed per chain")
+    run_parser.add_argument("--chunksize", type=int, default=16, help="chains sent to a worker at once")
+    run_parser.add_argument("--output", help="JSON Lines file (default: stdout)")
+    run_parser.add_argument("--force", action="store_true", help="run programs that fail validation")
+    run_parser.set_defaults(func=command_run)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+# coding: utf-8
+
+import json
+import uuid
+import queue
+import socket
+import asyncio
+import argparse
+import threading
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+LINK_KINDS = ("next", "elem", "nest")  # state で送る接続先の種類
+STATE_KEYS = ("x", "y") + LINK_KINDS  # state の項目
+
+# 編集操作 (1 行 1 JSON)
+#   {"op": "add", "id": ..., "type": ..., "text": ..., "x": ..., "y": ..., "next": ..., "elem": ..., "nest": ...}
+#   {"op": "state", "id": ..., "x": ..., "y": ..., "next": ..., "elem": ..., "nest": ...}
+#   {"op": "text", "id": ..., "text": ...}
+# すべての操作に送信元の "site" と Lamport 時刻 "clock" が付く.
+# Block ごとの state (始点と接続先の id) と文字列は, (clock, site) が大きい操作を採用する
+# (last writer wins). add は state の初期値も兼ねる.
+# 接続は全 Block の state から resolve_links で決めるので, 同じ操作を受け取った client は
+# 受け取った順序に依らず同じ位置と接続になる.
+
+
+class SyncServer:
+    # 受け取った操作を他のすべての client に中継する
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.host = host
+        self.port = port
+
+        self.log = {}  # (op, id) -> (stamp, 行). 途中から参加した client に送る最新の操作
+        self.writers = set()
+        self.started = threading.Event()  # 接続を受け付け始めたか, 起動に失敗したか
+        self.error = None  # 起動に失敗した理由
+
+    async def handle(self, reader, writer):
+        # 因果関係を保つよう stamp の順に送る
+        for _, line in sorted(self.log.values()):
+            writer.write(line)
+        self.writers.add(writer)
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    self.record(json.loads(line), line)
+                except (ValueError, KeyError):
+                    continue
+                for other in self.writers:
+                    if other is not writer:
+                        other.write(line)
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    def record(self, op, line):
+        # 後の操作で上書きされる操作は残さず, log を Block ごとの最新の操作に保つ
+        key = (op["op"], op.get("id"))
+        latest = self.log.get(key)
+        if latest is None or stamp(op) > latest[0]:
+            self.log[key] = (stamp(op), line)
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.started.set()
+        async with server:
+            await server.serve_forever()
+
+    def serve_forever(self):
+        try:
+            asyncio.run(self.serve())
+        except OSError as e:
+            if self.started.is_set():
+                raise
+            self.error = e
+            self.started.set()
+
+    def start_in_thread(self):
+        # port を使えないなどで起動できなければ OSError を送出する
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        if not self.started.wait(5):
+            raise OSError("sync server did not start on port " + str(self.port))
+        if self.error is not None:
+            raise self.error
+        return thread
+
+
+class SyncClient:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.site = uuid.uuid4().hex[:8]  # この client の識別子
+        self.clock = 0  # Lamport 時刻
+        self.counter = 0  # Block id の連番
+
+        self.sock = socket.create_connection((host, port))
+        self.inbox = queue.Queue()
+
+        threading.Thread(target=self.receive, daemon=True).start()
+
+    def new_id(self):
+        self.counter += 1
+        return self.site + ":" + str(self.counter)
+
+    def send(self, op):
+        # op を送信し, その stamp を返す
+        self.clock += 1
+        op["site"] = self.site
+        op["clock"] = self.clock
+        self.sock.sendall((json.dumps(op) + "\n").encode("utf-8"))
+        return stamp(op)
+
+    def receive(self):
+        with self.sock.makefile("r", encoding="utf-8") as f:
+            for line in f:
+                self.inbox.put(json.loads(line))
+
+    def poll(self):
+        # 受信済みの操作をすべて取り出す
+        ops = []
+        while True:
+            try:
+                op = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            self.clock = max(self.clock, op["clock"]) + 1
+            ops.append(op)
+        return ops
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def stamp(op):
+    return op["clock"], op["site"]
+
+
+def merge_state(states, op):
+    # add, state の操作を Block id -> (stamp, state) に反映する (last writer wins). 採用したら True
+    shared = states.get(op["id"])
+    if shared is not None and shared[0] >= stamp(op):
+        return False
+
+    states[op["id"]] = (stamp(op), {key: op[key] for key in STATE_KEYS})
+    return True
+
+
+def resolve_links(states):
+    # states: Block id -> (stamp, state). 全 Block の state から接続 {親 id: {種類: 子 id}} を決める
+    # 新しい state の接続を優先し, 子がすでに他の親を持つ接続と循環する接続は捨てる
+    edges = []
+    for parent, (state_stamp, state) in states.items():
+        for kind in LINK_KINDS:
+            child = state.get(kind)
+            if child is not None and child != parent and child in states:
+                edges.append((state_stamp, parent, kind, child))
+    edges.sort(reverse=True)
+
+    back = {}  # 子 id -> 親 id
+    links = {}
+    for _, parent, kind, child in edges:
+        if child in back:
+            continue
+        ancestor = parent
+        while ancestor is not None and ancestor != child:
+            ancestor = back.get(ancestor)
+        if ancestor == child:
+            continue
+        back[child] = parent
+        links.setdefault(parent, {})[kind] = child
+
+    return links
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relay block edits between editors")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    SyncServer(args.host, args.port).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
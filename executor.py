@@ -0,0 +1,129 @@
+# coding: utf-8
+
+import sys
+import io
+import signal
+import traceback
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from exporter import load_code
+
+CODE_CACHE_SIZE = 256  # compile 結果を保持する数
+TIMEOUT_INTERVAL = 0.1  # 時間切れの後, ScriptTimeout を捕まえられても送り直す間隔 [s]
+
+_pool = None  # chain を実行する worker process
+_code_cache = OrderedDict()  # (filename, script) -> code object. 全 tab で共有する
+_alarm = {"armed": False, "fired": False}  # 実行中の script の時間切れの状態
+
+
+@contextmanager
+def stdoutIO():
+    old = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        yield sys.stdout
+    finally:
+        sys.stdout = old
+
+
+def compile_script(script, filename="<string>"):
+    key = (filename, script)
+    code = _code_cache.get(key)
+    if code is None:
+        code = compile(script, filename, "exec")
+        _code_cache[key] = code
+        if len(_code_cache) > CODE_CACHE_SIZE:
+            _code_cache.popitem(last=False)
+    else:
+        _code_cache.move_to_end(key)
+
+    return code
+
+
+class ScriptTimeout(BaseException):
+    # 実行される code の except Exception で握りつぶされないよう BaseException にする
+    pass
+
+
+def _on_alarm(signum, frame):
+    # script が終わるまで TIMEOUT_INTERVAL ごとに送り直す
+    if _alarm["armed"]:
+        _alarm["fired"] = True
+        raise ScriptTimeout()
+
+
+def execute_script(script, timeout=None):
+    # script を実行し, 標準出力, traceback, 時間切れかを返す
+    return _execute(lambda: compile_script(script), {"__name__": "__main__"}, timeout)
+
+
+def execute_file(path, timeout=None):
+    # export された module を, __pycache__ の bytecode があればそれで実行する
+    return _execute(lambda: load_code(path), {"__name__": "__main__", "__file__": path}, timeout)
+
+
+def format_error(*harness_files):
+    # 処理中の例外の traceback. 先頭にある実行環境 (この module, exporter, harness_files) の frame は除く
+    etype, value, tb = sys.exc_info()
+    skip = set(harness_files) | {format_error.__code__.co_filename, load_code.__code__.co_filename}
+    while tb is not None and tb.tb_frame.f_code.co_filename in skip:
+        tb = tb.tb_next
+    return "".join(traceback.format_exception(etype, value, tb))
+
+
+def _execute(load, namespace, timeout):
+    # timeout は process の main thread でのみ有効
+    # user code が except: や except BaseException: で ScriptTimeout を捕まえても止まるよう,
+    # alarm は script が終わるまで繰り返す
+    use_alarm = timeout is not None and hasattr(signal, "setitimer")
+    if use_alarm:
+        old_handler = signal.signal(signal.SIGALRM, _on_alarm)
+        _alarm["armed"], _alarm["fired"] = True, False
+        signal.setitimer(signal.ITIMER_REAL, timeout, TIMEOUT_INTERVAL)
+
+    with stdoutIO() as stdout_string:
+        error = ""
+        try:
+            try:
+                exec(load(), namespace)
+            finally:
+                _alarm["armed"] = False
+        except ScriptTimeout:
+            pass
+        except:
+            error = format_error()
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, old_handler)
+
+        # 捕まえられた後に正常に終わっても時間切れとして扱う
+        timed_out = use_alarm and _alarm["fired"]
+        if timed_out:
+            error = "Timeout: exceeded " + str(timeout) + " seconds\n"
+
+        return {"output": stdout_string.getvalue(), "error": error, "timeout": timed_out}
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        # Kivy の process を fork しないよう spawn で起動する
+        _pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def submit_files(paths, timeout=None):
+    # export された各 module を別の worker process で並行に実行する
+    pool = get_pool()
+    return [pool.submit(execute_file, path, timeout) for path in paths]
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
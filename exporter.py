@@ -0,0 +1,106 @@
+# coding: utf-8
+
+import os
+import marshal
+import hashlib
+import py_compile
+import importlib.util
+
+# Execute 時に chain を書き出す directory
+MODULE_DIR = os.environ.get("VPL_MODULE_DIR", os.path.join(os.getcwd(), "vpl_modules"))
+
+
+def module_name(source):
+    # 内容の hash を名前にし, 変化のない chain は同じ module を使い回す
+    return "chain_" + hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+
+
+def export_module(source, directory=None, name=None):
+    # source を <name>.py に書き出し, __pycache__ に bytecode を作る
+    if directory is None:
+        directory = MODULE_DIR
+    if name is None:
+        name = module_name(source)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    path = os.path.join(directory, name + ".py")
+    source_bytes = source.encode("utf-8")
+
+    # 内容が同じなら書き換えない
+    try:
+        with open(path, "rb") as f:
+            unchanged = f.read() == source_bytes
+    except OSError:
+        unchanged = False
+    if not unchanged:
+        with open(path, "wb") as f:
+            f.write(source_bytes)
+
+    cfile = importlib.util.cache_from_source(path)
+    if not is_current(cfile, source_bytes):
+        try:
+            py_compile.compile(path, cfile=cfile, doraise=True,
+                               invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH)
+        except py_compile.PyCompileError:
+            # bytecode は作らず, 構文の誤りは実行時に load_code の compile で報告する
+            pass
+
+    return path
+
+
+def prune_modules(keep, directory=None):
+    # keep 以外の chain_<hash>.py とその bytecode を消し, directory が増え続けないようにする
+    if directory is None:
+        directory = MODULE_DIR
+    keep = set(os.path.abspath(path) for path in keep)
+
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.abspath(os.path.join(directory, name))
+        if not (name.startswith("chain_") and name.endswith(".py")) or path in keep:
+            continue
+        for stale in (path, importlib.util.cache_from_source(path)):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+def is_current(cfile, source_bytes):
+    # bytecode が source の hash と一致するか
+    try:
+        with open(cfile, "rb") as f:
+            header = f.read(16)
+    except OSError:
+        return False
+
+    return (len(header) == 16
+            and header[:4] == importlib.util.MAGIC_NUMBER
+            and int.from_bytes(header[4:8], "little") & 0b1
+            and header[8:16] == importlib.util.source_hash(source_bytes))
+
+
+def load_code(path):
+    # 書き出した module の code object. bytecode が古ければ compile し直す
+    with open(path, "rb") as f:
+        source_bytes = f.read()
+
+    cfile = importlib.util.cache_from_source(path)
+    if is_current(cfile, source_bytes):
+        with open(cfile, "rb") as f:
+            return marshal.loads(f.read()[16:])
+
+    return compile(source_bytes, path, "exec")
+
+
+def compile_error(path):
+    # 書き出した module の構文の誤り. なければ None
+    try:
+        load_code(path)
+    except (SyntaxError, ValueError) as e:
+        return path + ": " + str(e)
+    return None
@@ -1,38 +1,150 @@
 # coding: utf-8
 
-import sys
-import io
-import traceback
-from contextlib import contextmanager
+import os
+import json
+import tracemalloc
 
 from kivy.app import App
+from kivy.clock import Clock
+from kivy.graphics import Color, Line, PopMatrix, PushMatrix, Translate
+from kivy.properties import ObjectProperty
 from kivy.uix.widget import Widget
 from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.tabbedpanel import TabbedPanel, TabbedPanelItem
+from kivy.uix.textinput import TextInput
 from kivy.config import Config
 
 import blocks
+import executor
+import exporter
+import memory_report
+from result_cache import ResultCache
+from collab import DEFAULT_PORT, LINK_KINDS, SyncServer, SyncClient, merge_state, resolve_links, stamp
+from minimap import Minimap  # noqa: F401 (vpl.kv で使う)
+from tracer import Tracer
+from blocks.block_status import BlockStatus
+from blocks.concrete_block import ConcreteBlock
+from blocks.port_index import PortIndex
+from blocks.serializer import BLOCK_TYPES, dump_blocks, load_blocks
+from blocks.validator import Validator
 
 Config.set('input', 'mouse', 'mouse,multitouch_on_demand')
 Config.set('graphics', 'width', '900')
 Config.set('graphics', 'height', '600')
 
 
-@contextmanager
-def stdoutIO():
-    old = sys.stdout
-    sys.stdout = io.StringIO()
-    yield sys.stdout
-    sys.stdout = old
+class CodeArea(Widget):
+    snap_preview = True  # drag 中に接続先を強調表示するか
 
+    # 実行結果の cache. 全 tab で共有し, VPL_CACHE_DIR があれば disk にも保存する
+    result_cache = ResultCache(directory=os.environ.get("VPL_CACHE_DIR"))
+    use_result_cache = False  # 変更のない program の結果を再利用するか
+    run_timeout = 5.0  # Execute で 1 つの chain に許す秒数
 
-class CodeArea(Widget):
     def __init__(self, **kwargs):
         super(CodeArea, self).__init__(**kwargs)
 
         self.codes = []
+        self.heads = []  # 各 chain の先頭 Block
+        self.selected_block = None  # 最後に触れた Block
 
         self.select_block = blocks.PrintBlock
 
+        self.validator = Validator()
+
+        self.tracer = None  # debug 実行中の Tracer
+        self.run_futures = []  # 実行中の chain の Future
+        self.run_event = None  # 実行結果を待つ Clock の event
+        self.line_table = {}  # 行番号 -> Block
+
+        self.model = None  # 非表示の間だけ保持する dump_blocks の結果
+
+        self.collab = None  # 共同編集の SyncClient
+        self.blocks_by_id = {}  # Block id -> Block
+        self.text_stamps = {}  # Block id -> 文字列を最後に変更した操作の stamp
+        self.block_states = {}  # Block id -> (stamp, 位置と接続先). 最後に採用した state
+        self.applying_remote = False  # 他の client の操作を反映中か
+        self.drag_block = None  # drag 中の Block
+        self.drag_chain = set()  # drag 中の Block と一緒に動く Block
+        self.snap_target = None  # drag 中の Block の接続先の候補
+
+        self.positions = {}  # Block -> minimap と port_index に反映済みの始点と終点
+        self.port_index = PortIndex()  # 接続点の検索用
+
+        self.selection = set()  # 選択中の Block
+        self.clipboard = None  # copy した Block の dump_blocks の結果
+        self.group_drag = None  # 選択中の Block を drag している mouse の位置
+        self.group_pending = (0, 0)  # まだ反映していない選択中の Block の移動量
+        self.group_move_trigger = Clock.create_trigger(self.apply_group_move)
+        self.band = None  # 範囲選択の矩形
+        self.band_color = None
+        self.band_start = None
+
+        # 表示範囲. Block の座標 = 画面の座標 - view_offset
+        with self.canvas.before:
+            PushMatrix()
+            self.view_translate = Translate(0, 0)
+        with self.canvas.after:
+            PopMatrix()
+
+    def export_program(self, directory, name):
+        # 全 chain を 1 つの module に書き出す
+        code = "\n".join(self.make_code(head) for head in self.heads)
+        return exporter.export_module(code, directory, name)
+
+    def save_program(self, path):
+        with open(path, "w") as f:
+            json.dump(dump_blocks(self.codes), f, indent=1)
+
+    @property
+    def panel(self):
+        # code と実行結果を表示する Widget
+        return App.get_running_app().root.ids
+
+    def activate(self):
+        if self.model is None:
+            return
+
+        self.codes = load_blocks(self.model)
+        for block in self.codes:
+            block.on_edit = self.on_block_edit
+            block.on_drag = self.preview_snap
+            self.add_widget(block)
+            if block.breakpoint:
+                block.mark("breakpoint", (0.6, 0, 0.8, 0.4))
+        self.update_heads()
+        self.model = None
+
+        self.panel["minimap"].code_area = self
+        self.notify_moved()
+
+        if self.collab is not None:
+            # 非表示の間に届いた操作をここから反映する
+            self.blocks_by_id = {block.block_id: block for block in self.codes
+                                 if block.block_id is not None}
+            Clock.schedule_interval(self.apply_remote, 0)
+
+    def deactivate(self):
+        # 非表示の tab は Widget を解放し, model だけを保持する
+        self.stop_trace()
+        self.cancel_run()
+        if self.collab is not None:
+            # 共同編集は続け, 届いた操作は activate まで受信したままにする
+            Clock.unschedule(self.apply_remote)
+
+        self.model = dump_blocks(self.codes)
+        self.clear_widgets()
+        self.codes = []
+        self.heads = []
+        self.selected_block = None
+        self.line_table = {}
+        self.validator.clear()
+        self.positions = {}
+        self.port_index.clear()
+        self.selection = set()
+        self.blocks_by_id = {}
+        self.panel["minimap"].clear()
+
     def set_block(self, n):
         if n == "print":
             self.select_block = blocks.PrintBlock
@@ -49,68 +161,681 @@ class CodeArea(Widget):
         elif n == "call":
             self.select_block = blocks.CallBlock
 
+    def to_local(self, x, y):
+        return x - self.view_translate.x, y - self.view_translate.y
+
+    def view_box(self):
+        # 表示している範囲 (x0, y0, x1, y1)
+        x0, y0 = self.to_local(self.x, self.y)
+        return x0, y0, x0 + self.width, y0 + self.height
+
+    def jump_to(self, x, y):
+        # (x, y) が中央に来るように表示範囲を移す
+        self.view_translate.x = self.center_x - x
+        self.view_translate.y = self.center_y - y
+
+    def notify_moved(self):
+        # 移動, 伸縮された Block を minimap と port_index に反映する
+        moved = []
+        for block in self.codes:
+            position = (block.block_start_point.x, block.block_start_point.y,
+                        block.block_end_point.x, block.block_end_point.y)
+            if self.positions.get(block) != position:
+                self.positions[block] = position
+                self.port_index.update(block)
+                moved.append(block)
+        if moved:
+            self.panel["minimap"].update_blocks(moved)
+
     def on_touch_down(self, touch):
+        touch.push()
+        touch.apply_transform_2d(self.to_local)
+
         if "button" in touch.profile:
             if touch.button == "right":
-                new_block = self.select_block()
-                new_block.draw(touch.pos[0], touch.pos[1])
-                self.codes.append(new_block)
-                self.add_widget(new_block)
+                new_block = self.add_block(self.select_block, touch.pos[0], touch.pos[1])
+                if self.collab is not None:
+                    self.share_blocks([new_block])
+            elif touch.button == "middle":
+                self.toggle_breakpoint(touch)
+            elif touch.button == "left":
+                touched = self.block_at(touch)
+                if touched is not None and touched in self.selection:
+                    # 選択中の Block をまとめて drag する
+                    self.group_drag = touch.pos
+                    touch.pop()
+                    return True
+
+                self.select_blocks([])
+                if touched is None:
+                    self.band_start = touch.pos
+                    with self.canvas:
+                        self.band_color = Color(0.3, 0.6, 1, 0.8)
+                        self.band = Line(rectangle=(touch.pos[0], touch.pos[1], 0, 0))
 
-        return super(CodeArea, self).on_touch_down(touch)
+        result = super(CodeArea, self).on_touch_down(touch)
+
+        for block in self.codes:
+            if block.is_touched:
+                self.selected_block = block
+                self.drag_block = block
+                self.drag_chain = set(block.chain_blocks())
+
+        touch.pop()
+        return result
+
+    def on_touch_move(self, touch):
+        touch.push()
+        touch.apply_transform_2d(self.to_local)
+
+        if self.group_drag is not None:
+            # 移動量を溜め, 1 frame に 1 回だけ平行移動する
+            dx, dy = self.group_drag[0] - touch.pos[0], self.group_drag[1] - touch.pos[1]
+            self.group_pending = (self.group_pending[0] + dx, self.group_pending[1] + dy)
+            self.group_drag = touch.pos
+            self.group_move_trigger()
+            touch.pop()
+            return True
+
+        if self.band is not None:
+            x0, y0 = self.band_start
+            self.band.rectangle = (x0, y0, touch.pos[0] - x0, touch.pos[1] - y0)
+
+        result = super(CodeArea, self).on_touch_move(touch)
+        touch.pop()
+        return result
 
     def on_touch_up(self, touch):
+        touch.push()
+        touch.apply_transform_2d(self.to_local)
+
         if "button" in touch.profile:
+            if touch.button == "left" and self.group_drag is not None:
+                self.group_move_trigger.cancel()
+                self.apply_group_move()
+                self.group_drag = None
+                self.connect_selection()
+                self.share_changes()
+                self.notify_moved()
+                touch.pop()
+                return True
+
             if touch.button == "left":
-                self.connect_block()
+                if self.band is not None:
+                    self.finish_band(touch.pos)
 
-        return super(CodeArea, self).on_touch_up(touch)
+                # 接続の前に, まだ反映していない移動を反映する
+                if self.drag_block is not None:
+                    self.drag_block.move_trigger.cancel()
+                    self.drag_block.apply_pending_move()
+                    self.show_snap_target(None)
 
-    def connect_block(self):
-        # 接続の初期化
+                    # preview_snap と同じ nearest_port の規則で繋ぐ
+                    self.connect_group(self.drag_chain)
+                    self.drag_chain = set()
+                    self.share_changes()
+                    self.notify_moved()
+
+                self.drag_block = None
+
+        result = super(CodeArea, self).on_touch_up(touch)
+        touch.pop()
+        return result
+
+    def apply_group_move(self, *args):
+        dx, dy = self.group_pending
+        self.group_pending = (0, 0)
+        if dx or dy:
+            for block in self.selection:
+                block.translate(dx, dy)
+
+    def preview_snap(self, block):
+        # drag 中の block が今離されたら繋がる先を強調表示する
+        if CodeArea.snap_preview:
+            self.show_snap_target(self.nearest_port(block))
+
+    def nearest_port(self, block):
+        # block を今の位置で離したときに繋がる接続点 (Block, "next" | "elem" | "nest")
+        # DISTANCE_RANGE 以内になければ None. block と一緒に動く Block の接続点は除く
+        if block is self.drag_block:
+            exclude = self.drag_chain
+        else:
+            exclude = set(block.chain_blocks())
+        return self.port_index.nearest(block, exclude)
+
+    def show_snap_target(self, target):
+        parent = None if target is None else target[0]
+        if parent is self.snap_target:
+            return
+        if self.snap_target is not None:
+            self.snap_target.mark("snap", None)
+        if parent is not None:
+            parent.mark("snap", (0, 1, 0, 0.4))
+        self.snap_target = parent
+
+    def block_at(self, touch):
+        for block in reversed(self.codes):
+            if block.is_in_block(touch):
+                return block
+        return None
+
+    def finish_band(self, pos):
+        # 矩形に重なる Block を選択する
+        x0, x1 = sorted((self.band_start[0], pos[0]))
+        y0, y1 = sorted((self.band_start[1], pos[1]))
+        self.canvas.remove(self.band_color)
+        self.canvas.remove(self.band)
+        self.band = None
+
+        selected = []
+        for block in self.codes:
+            bx0, by0, bx1, by1 = block.bounding_box()
+            if bx0 <= x1 and x0 <= bx1 and by0 <= y1 and y0 <= by1:
+                selected.append(block)
+        self.select_blocks(selected)
+
+    def select_blocks(self, selected):
+        for block in self.selection:
+            block.mark("selection", None)
+        self.selection = set(selected)
+        for block in self.selection:
+            block.mark("selection", (0.3, 0.6, 1, 0.4))
+
+    def connect_selection(self):
+        self.connect_group(self.selection)
+
+    def connect_group(self, group):
+        # group をまたぐ接続だけを切り, 境界でだけ接続し直す
+        connections = [block.connection() for block in self.codes]
+        changed = set()
+
+        for block in group:
+            if block.back_block is not None and block.back_block not in group:
+                changed.add(block.back_block)
+                block.back_block.detach(block)
+            for kind in block.port_kinds:
+                child = getattr(block, kind + "_block")
+                if child is not None and child not in group:
+                    block.detach(child)
+                    changed.add(block)
+
+        # group の先頭を外の接続点へ繋ぐ. 外の接続点は port_index で探す
+        for child in group:
+            if child.back_block is None:
+                target = self.port_index.nearest(child, group)
+                if target is not None:
+                    parent, kind = target
+                    parent.attach(kind, child)
+                    changed.add(parent)
+
+        # 外の先頭を group の接続点へ繋ぐ. 外の先頭は port_index で探す
+        for parent in group:
+            for kind, _ in parent.open_ports():
+                child = self.port_index.nearest_child(parent, kind, group)
+                if child is not None:
+                    parent.attach(kind, child)
+                    changed.add(parent)
+
+        # 入れ子の大きさが変わった Block を外側に向かって更新する
+        for block in changed:
+            while block is not None:
+                block.update()
+                block = block.back_block
+
+        for block, connection in zip(self.codes, connections):
+            if block.connection() != connection:
+                block.dirty = True
+        self.update_heads()
+
+    def copy_blocks(self):
+        if self.selection:
+            self.clipboard = dump_blocks([block for block in self.codes if block in self.selection])
+
+    def paste_blocks(self):
+        # 構造ごと複製し, 少しずらして配置する
+        if self.clipboard is None:
+            return
+
+        pasted = load_blocks(self.clipboard, dx=30, dy=-30)
+        for block in pasted:
+            block.block_id = None
+            block.on_edit = self.on_block_edit
+            block.on_drag = self.preview_snap
+            self.codes.append(block)
+            self.add_widget(block)
+        if self.collab is not None:
+            self.share_blocks(pasted)
+
+        self.update_heads()
+        self.notify_moved()
+        self.select_blocks(pasted)
+
+    def add_block(self, block_type, x, y):
+        new_block = block_type()
+        new_block.draw(x, y)
+        new_block.on_edit = self.on_block_edit
+        new_block.on_drag = self.preview_snap
+        self.codes.append(new_block)
+        self.add_widget(new_block)
+        if new_block.status != BlockStatus.Argument:
+            self.heads.append(new_block)
+
+        self.positions[new_block] = (new_block.block_start_point.x, new_block.block_start_point.y,
+                                     new_block.block_end_point.x, new_block.block_end_point.y)
+        self.port_index.update(new_block)
+        self.panel["minimap"].update_blocks([new_block])
+
+        return new_block
+
+    def start_collab(self, serve=False, port=DEFAULT_PORT):
+        # serve なら sync server もこの process で起動する
+        if self.collab is not None:
+            return
+        try:
+            if serve:
+                SyncServer(port=port).start_in_thread()
+            self.collab = SyncClient(port=port)
+        except OSError as e:
+            self.panel["ti_exec"].text = "Collab failed: " + str(e)
+            return
+
+        self.share_blocks(self.codes)
+        Clock.schedule_interval(self.apply_remote, 0)
+
+    def stop_collab(self):
+        if self.collab is None:
+            return
+
+        Clock.unschedule(self.apply_remote)
+        self.collab.close()
+        self.collab = None
+        self.blocks_by_id = {}
+        self.text_stamps = {}
+        self.block_states = {}
+
+    @staticmethod
+    def block_state(block):
+        # 他の client と共有する Block の始点と接続先の id
+        state = {"x": float(block.block_start_point.x), "y": float(block.block_start_point.y)}
+        for kind in LINK_KINDS:
+            child = getattr(block, kind + "_block", None)
+            state[kind] = None if child is None else child.block_id
+        return state
+
+    def share_blocks(self, shared):
+        # 接続先を id で送れるよう, 先にすべての Block に id を振る
+        for block in shared:
+            if block.block_id is None:
+                block.block_id = self.collab.new_id()
+            self.blocks_by_id[block.block_id] = block
+
+        for block in shared:
+            state = self.block_state(block)
+            op = {"op": "add", "id": block.block_id, "type": type(block).__name__,
+                  "text": getattr(block, block.text_field) if block.text_field is not None else ""}
+            op.update(state)
+            op_stamp = self.collab.send(op)
+            self.text_stamps[block.block_id] = op_stamp
+            self.block_states[block.block_id] = (op_stamp, state)
+
+    def share_changes(self):
+        # 位置か接続先が変わった Block の state を送る
+        if self.collab is None:
+            return
+
+        for block in self.codes:
+            if block.block_id is None:
+                continue
+            state = self.block_state(block)
+            shared = self.block_states.get(block.block_id)
+            if shared is None or shared[1] != state:
+                op = {"op": "state", "id": block.block_id}
+                op.update(state)
+                self.block_states[block.block_id] = (self.collab.send(op), state)
+
+    def on_block_edit(self, block):
+        if self.collab is None or self.applying_remote:
+            return
+
+        self.text_stamps[block.block_id] = self.collab.send({
+            "op": "text", "id": block.block_id, "text": getattr(block, block.text_field)
+        })
+
+    def apply_remote(self, dt):
+        # 1 frame 分の操作をまとめて反映し, 位置と接続は最後に 1 回だけ決め直す
+        # drag 中は受信した操作を残しておき, drag の結果を送ってから反映する
+        if self.drag_block is not None or self.group_drag is not None:
+            return
+
+        changed = False
+        self.applying_remote = True
+        try:
+            for op in self.collab.poll():
+                block = self.blocks_by_id.get(op.get("id"))
+                if op["op"] == "add":
+                    if block is None:
+                        block = self.add_block(BLOCK_TYPES[op["type"]], op["x"], op["y"])
+                        block.block_id = op["id"]
+                        self.blocks_by_id[block.block_id] = block
+                        self.text_stamps[block.block_id] = stamp(op)
+                        self.set_block_text(block, op["text"])
+                        changed = True  # 先に届いた state があれば合わせる
+                    changed = merge_state(self.block_states, op) or changed
+                elif op["op"] == "state":
+                    changed = merge_state(self.block_states, op) or changed
+                elif op["op"] == "text" and block is not None:
+                    # last writer wins
+                    if stamp(op) > self.text_stamps.get(block.block_id, (0, "")):
+                        self.text_stamps[block.block_id] = stamp(op)
+                        self.set_block_text(block, op["text"])
+        finally:
+            self.applying_remote = False
+
+        if changed:
+            self.apply_states()
+
+    def apply_states(self):
+        # 採用した state から接続を決め直し, 各 Block をその始点へ動かす
+        connections = [block.connection() for block in self.codes]
         for block in self.codes:
             block.initialize_connect()
 
-        # 接続の判定
-        for block_1 in self.codes:
-            for block_2 in self.codes:
-                if block_1 is block_2:
-                    continue
-                block_1.connect_block(block_2)
+        for parent_id, children in resolve_links(self.block_states).items():
+            parent = self.blocks_by_id.get(parent_id)
+            for kind, child_id in children.items():
+                child = self.blocks_by_id.get(child_id)
+                if parent is not None and child is not None:
+                    setattr(parent, kind + "_block", child)
+                    child.back_block = parent
+
+        for block in self.codes:
+            shared = self.block_states.get(block.block_id)
+            if shared is not None:
+                block.translate(block.block_start_point.x - shared[1]["x"],
+                                block.block_start_point.y - shared[1]["y"])
+            if block.status == BlockStatus.Nest:
+                block.update_bar()
+
+        for block, connection in zip(self.codes, connections):
+            if block.connection() != connection:
+                block.dirty = True
+        self.update_heads()
+        self.notify_moved()
+
+    @staticmethod
+    def set_block_text(block, text):
+        if block.text_field is None:
+            return
+
+        setattr(block, block.text_field, text)
+        block.dirty = True
+        for component in block.components:
+            if isinstance(component, TextInput):
+                component.text = text
+
+    def update_heads(self):
+        self.heads = ConcreteBlock.find_heads(self.codes)
+
+    def check_block(self, targets=None):
+        if targets is None:
+            targets = self.codes
+        diagnostics = self.validator.validate(targets)
+
+        # 問題のある Block を赤く表示
+        invalid = set(block for block, _ in diagnostics)
+        for block in targets:
+            block.mark("error", (1, 0, 0, 0.4) if block in invalid else None)
+
+        self.panel["ti_exec"].text = Validator.format(diagnostics)
+
+        return diagnostics
+
+    def selected_head(self):
+        # 最後に触れた Block を含む chain の先頭. chain がひとつならそれを返す
+        if len(self.heads) == 1:
+            return self.heads[0]
+
+        block = self.selected_block
+        if block is None:
+            return None
+        while block.back_block is not None:
+            block = block.back_block
+        return block if block in self.heads else None
+
+    def make_code(self, head):
+        exec_script, _ = ConcreteBlock.make_chain_code(head, "", 0)
+
+        return exec_script
+
+    def exec_block(self, run_all=False, bypass_cache=False):
+        # run_all なら独立したすべての chain, そうでなければ選択中の chain を実行する
+        # bypass_cache なら cache を使わずに実行し, 結果で cache を更新する
+        if run_all:
+            heads = list(self.heads)
+        else:
+            head = self.selected_head()
+            heads = [] if head is None else [head]
+        if not heads:
+            self.panel["ti_exec"].text = ("No block to run" if not self.heads
+                                          else "Select a chain or use Run All")
+            return
+
+        targets = []
+        for head in heads:
+            targets.extend(head.chain_blocks())
+        if self.check_block(targets):
+            return
+
+        # 前の実行の結果は表示しない
+        self.cancel_run()
+
+        scripts = [self.make_code(head) for head in heads]
+        key = ResultCache.key(scripts)
+
+        if CodeArea.use_result_cache and not bypass_cache:
+            cached = CodeArea.result_cache.get(key)
+            if cached is not None:
+                code, results = cached
+                self.panel["ti_code"].text = code
+                self.show_results(["[cached]\n" + result for result in results])
+                return
+
+        if len(scripts) == 1:
+            code = scripts[0]
+        else:
+            code = "\n".join(
+                "# chain " + str(i + 1) + "\n" + script for i, script in enumerate(scripts)
+            )
+        self.panel["ti_code"].text = code
 
-        # 接続状況に従い更新
+        # 各 chain を module に書き出し, worker process で並行に実行する
+        # traceback には書き出した file の行番号が出る
+        paths = [exporter.export_module(script) for script in scripts]
+        # 今回使わない module は消す
+        exporter.prune_modules(paths)
+        futures = executor.submit_files(paths, CodeArea.run_timeout)
+        self.run_futures = futures
+
+        def show(dt):
+            if futures is not self.run_futures:
+                return False
+            if not all(future.done() for future in futures):
+                return True
+            results = [self.future_result(future) for future in futures]
+            texts = [result["output"] + result["error"] for result in results]
+            # 時間切れや worker の失敗は program の結果ではないので cache しない
+            if CodeArea.use_result_cache and not any(
+                    result["timeout"] or result.get("failed") for result in results):
+                CodeArea.result_cache.put(key, code, texts)
+            self.show_results(texts)
+            self.run_futures = []
+            self.run_event = None
+            return False
+
+        self.run_event = Clock.schedule_interval(show, 0.05)
+
+    def cancel_run(self):
+        # 結果待ちの実行をやめる. 始まっていない chain は実行しない
+        if self.run_event is not None:
+            self.run_event.cancel()
+            self.run_event = None
+        for future in self.run_futures:
+            future.cancel()
+        self.run_futures = []
+
+    @staticmethod
+    def toggle_result_cache(button):
+        CodeArea.use_result_cache = not CodeArea.use_result_cache
+        button.text = "Cache: On" if CodeArea.use_result_cache else "Cache: Off"
+
+    @staticmethod
+    def future_result(future):
+        # execute_file の結果. worker が失敗したら "failed" を付ける
+        try:
+            return future.result()
+        except Exception as e:
+            return {"output": "", "error": "worker error: " + repr(e), "timeout": False, "failed": True}
+
+    def show_results(self, results):
+        # chain ごとの結果を横に並べて表示する
+        ids = self.panel
+        exec_area = ids["exec_area"]
+        for child in list(exec_area.children):
+            if child is not ids["ti_exec"]:
+                exec_area.remove_widget(child)
+
+        ids["ti_exec"].text = results[0]
+        for result in results[1:]:
+            exec_area.add_widget(TextInput(text=result))
+
+    def toggle_breakpoint(self, touch):
+        for block in self.codes:
+            if block.status != BlockStatus.Argument and block.is_in_block(touch):
+                block.breakpoint = not block.breakpoint
+                block.mark("breakpoint", (0.6, 0, 0.8, 0.4) if block.breakpoint else None)
+                return
+
+    def trace_block(self, stepping=False):
+        # 選択中の chain を trace しながら実行する
+        if self.tracer is not None and self.tracer.is_alive():
+            if self.tracer.paused:
+                if stepping:
+                    self.tracer.step()
+                else:
+                    self.tracer.resume()
+            return
+
+        head = self.selected_head()
+        if head is None or self.check_block(head.chain_blocks()):
+            return
+
+        # code 生成と同時に 行番号 -> Block 対応表を作る
+        ConcreteBlock.line_table = {}
+        try:
+            exec_script = self.make_code(head)
+            self.line_table = ConcreteBlock.line_table
+        finally:
+            ConcreteBlock.line_table = None
+
+        self.panel["ti_code"].text = exec_script
+
+        # 前回の trace の表示を消す
+        for block in self.codes:
+            block.mark("pause", None)
+            block.mark("trace", None)
+
+        breakpoints = [line for line, block in self.line_table.items() if block.breakpoint]
+        self.tracer = Tracer(
+            exec_script, breakpoints, stepping,
+            on_pause=lambda line: Clock.schedule_once(lambda dt: self.show_pause(line)),
+            on_finish=lambda output, hits, times: Clock.schedule_once(
+                lambda dt: self.show_trace(output, hits, times))
+        )
+        self.tracer.start()
+
+    def show_memory(self):
+        # tracemalloc が止まっていればここで開始する. traced_bytes はそれ以降の確保分だけになる
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+
+        text = memory_report.format_report(memory_report.report(self, memory_report.block_type_costs()))
+        if started:
+            text = "tracemalloc started now; traced bytes cover allocations from here on\n" + text
+        self.panel["ti_exec"].text = text
+
+    def stop_trace(self):
+        if self.tracer is not None:
+            self.tracer.stop()
+
+    def show_pause(self, line):
         for block in self.codes:
-            block.update()
-
-    def exec_block(self):
-        # すべてのブロックが接続されている
-        # = headがひとつのとき, 実行可能
-        head = None
-        count = 0
-        for code in self.codes:
-            if code.back_block is None:
-                head = code
-                count += 1
-        if count != 1:
+            block.mark("pause", None)
+
+        block = self.line_table.get(line)
+        if block is not None:
+            block.mark("pause", (1, 1, 0, 0.5))
+            self.panel["ti_exec"].text = (
+                "Paused at line " + str(line) + " (" + type(block).__name__ + ")"
+            )
+
+    def show_trace(self, output, hits, times):
+        # 実行時間の heatmap を表示する
+        longest = max(list(times.values()) + [1e-9])
+        for line, block in self.line_table.items():
+            heat = times.get(line, 0) / longest
+            block.mark("pause", None)
+            block.mark("trace", (1, 0.5, 0, 0.1 + 0.6 * heat) if hits.get(line, 0) else None)
+
+        report = []
+        for line in sorted(self.line_table):
+            report.append("line {0} {1}: {2} hits, {3:.3f} ms".format(
+                line, type(self.line_table[line]).__name__,
+                hits.get(line, 0), times.get(line, 0) * 1000
+            ))
+        self.panel["ti_exec"].text = output + "\n" + "\n".join(report)
+
+
+class Workspace(TabbedPanel):
+    code_area = ObjectProperty(None)  # 表示中の tab の CodeArea
+
+    def __init__(self, **kwargs):
+        super(Workspace, self).__init__(**kwargs)
+        self.tab_count = 0
+
+        Clock.schedule_once(lambda dt: self.new_tab())
+
+    def new_tab(self):
+        self.tab_count += 1
+        item = TabbedPanelItem(text="Program " + str(self.tab_count))
+        item.add_widget(CodeArea())
+        self.add_widget(item)
+        self.switch_to(item)
+
+    def save_program(self):
+        # 表示中の tab を "<tab 名>.json" に保存する
+        path = self.current_tab.text.replace(" ", "_") + ".json"
+        self.code_area.save_program(path)
+        self.code_area.panel["ti_exec"].text = "Saved to " + path
+
+    def export_program(self):
+        # 表示中の tab を "export/<tab 名>.py" に書き出す
+        path = self.code_area.export_program("export", self.current_tab.text.replace(" ", "_"))
+        error = exporter.compile_error(path)
+        self.code_area.panel["ti_exec"].text = "Exported to " + path + ("" if error is None else "\n" + error)
+
+    def switch_to(self, header, do_scroll=False):
+        if header.content is self.code_area:
             return
 
-        exec_script = ""
-        indent = 0
-        while head is not None:
-            exec_script, indent = head.make_code(exec_script, indent)
-            head = head.next_block
+        if self.code_area is not None:
+            self.code_area.deactivate()
 
-        self.parent.parent.ids["ti_code"].text = exec_script
+        super(Workspace, self).switch_to(header, do_scroll=do_scroll)
 
-        with stdoutIO() as stdout_string:
-            error = ""
-            try:
-                exec(exec_script)
-            except:
-                error = traceback.format_exc()
-            finally:
-                result = stdout_string.getvalue() + error
-                self.parent.parent.ids["ti_exec"].text = result
+        self.code_area = header.content
+        self.code_area.panel["minimap"].code_area = self.code_area
+        self.code_area.activate()
 
 
 class RootWidget(BoxLayout):
@@ -126,5 +851,18 @@ class VPLApp(App):
     def build(self):
         return RootWidget()
 
+    def on_start(self):
+        # VPL_MEMORY_LOG=<秒> なら使用量を定期的に log に残す
+        interval = os.environ.get("VPL_MEMORY_LOG")
+        if interval:
+            tracemalloc.start()
+            Clock.schedule_interval(
+                lambda dt: memory_report.log_report(self.root.ids["workspace"].code_area),
+                float(interval)
+            )
+
+    def on_stop(self):
+        executor.shutdown()
+
 if __name__ == "__main__":
     VPLApp().run()
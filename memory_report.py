@@ -0,0 +1,181 @@
+# coding: utf-8
+
+import os
+import gc
+import sys
+import json
+import argparse
+import tracemalloc
+
+if __name__ == "__main__":
+    # window を作らずに計測する
+    os.environ.setdefault("KIVY_NO_ARGS", "1")
+    os.environ.setdefault("KIVY_NO_CONSOLELOG", "1")
+    os.environ.setdefault("KIVY_GL_BACKEND", "mock")
+
+from kivy.graphics import Canvas, InstructionGroup
+from kivy.logger import Logger
+from kivy.uix.widget import Widget
+
+from blocks.serializer import BLOCK_TYPES
+
+_block_type_costs = None  # measure_block_types の結果. 初回の Memory で測る
+
+
+def count_instructions(group, textures):
+    # 子 Widget の canvas は Widget ごとに数えるので除く
+    count = 0
+    for instruction in group.children:
+        if isinstance(instruction, Canvas):
+            continue
+        count += 1
+
+        texture = getattr(instruction, "texture", None)
+        if texture is not None:
+            textures[id(texture)] = texture
+        if isinstance(instruction, InstructionGroup):
+            count += count_instructions(instruction, textures)
+
+    return count
+
+
+def count_widgets(root):
+    # root 以下の Widget, canvas の命令, texture を数える
+    widgets = 0
+    instructions = 0
+    textures = {}
+    for widget in root.walk():
+        widgets += 1
+        canvas = widget.canvas
+        if canvas.has_before:
+            instructions += count_instructions(canvas.before, textures)
+        instructions += count_instructions(canvas, textures)
+        if canvas.has_after:
+            instructions += count_instructions(canvas.after, textures)
+
+    texture_bytes = sum(texture.width * texture.height * 4 for texture in textures.values())
+    return {"widgets": widgets, "instructions": instructions,
+            "textures": len(textures), "texture_bytes": texture_bytes}
+
+
+def report(code_area, type_costs=None):
+    # 表示中の canvas 全体の使用量
+    # type_costs (measure_block_types の結果) があれば, 種類ごとの使用量を Block 数から見積もる
+    result = count_widgets(code_area)
+    result["blocks"] = len(code_area.codes)
+
+    per_type = {}
+    for block in code_area.codes:
+        name = type(block).__name__
+        per_type[name] = per_type.get(name, 0) + 1
+    result["blocks_per_type"] = per_type
+
+    if type_costs is not None:
+        result["estimated_bytes_per_type"] = {
+            name: int(count * type_costs[name]["bytes_per_block"])
+            for name, count in per_type.items() if name in type_costs
+        }
+
+    if tracemalloc.is_tracing():
+        result["traced_bytes"], result["traced_peak_bytes"] = tracemalloc.get_traced_memory()
+    else:
+        result["tracemalloc"] = "off"
+
+    return result
+
+
+def format_report(result):
+    lines = ["{0}: {1}".format(key, value) for key, value in sorted(result.items())
+             if not isinstance(value, dict)]
+    for key, value in sorted(result.items()):
+        if isinstance(value, dict):
+            lines.append(key + ":")
+            for name, count in sorted(value.items()):
+                lines.append("  {0}: {1}".format(name, count))
+    return "\n".join(lines)
+
+
+def block_type_costs(count=20):
+    # 種類ごとの 1 個あたりの使用量. 一度だけ測って使い回す
+    global _block_type_costs
+    if _block_type_costs is None:
+        _block_type_costs = measure_block_types(count)
+    return _block_type_costs
+
+
+def log_report(code_area):
+    # session 中の増え方を追えるように log に残す
+    Logger.info("Memory: " + json.dumps(report(code_area), sort_keys=True))
+
+
+def measure_block_types(count):
+    # 種類ごとに count 個の Block を描画し, 1 個あたりの使用量を測る
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    # 最初に測る種類が font や class の cache の確保を負担しないように,
+    # すべての種類を一度描画して捨ててから測る
+    warm_up = Widget()
+    for block_type in BLOCK_TYPES.values():
+        block = block_type()
+        block.draw(0, 0)
+        warm_up.add_widget(block)
+    warm_up.clear_widgets()
+    del warm_up, block
+
+    results = {}
+    for name, block_type in sorted(BLOCK_TYPES.items()):
+        parent = Widget()
+        gc.collect()
+        before = tracemalloc.get_traced_memory()[0]
+
+        for i in range(count):
+            block = block_type()
+            block.draw((i % 40) * 250, -(i // 40) * 150)
+            parent.add_widget(block)
+
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - before
+        counts = count_widgets(parent)
+
+        results[name] = {
+            "bytes_per_block": used / float(count),
+            "widgets_per_block": (counts["widgets"] - 1) / float(count),
+            "instructions_per_block": counts["instructions"] / float(count),
+            "textures": counts["textures"],
+        }
+
+        parent.clear_widgets()
+        del parent
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report memory used per block type")
+    parser.add_argument("--blocks", type=int, default=200, help="blocks drawn per type")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="fail if any block type uses more bytes per block")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args()
+
+    results = measure_block_types(args.blocks)
+
+    if args.json:
+        print(json.dumps(results, indent=1, sort_keys=True))
+    else:
+        for name, result in sorted(results.items()):
+            print("{0:14} {1:10.0f} B/block {2:5.1f} widgets {3:5.1f} instructions {4:3d} textures".format(
+                name, result["bytes_per_block"], result["widgets_per_block"],
+                result["instructions_per_block"], result["textures"]))
+
+    if args.budget is not None:
+        over = [name for name, result in results.items() if result["bytes_per_block"] > args.budget]
+        if over:
+            # Kivy は sys.stderr を log に差し替えるので, 元の stderr に書く
+            sys.__stderr__.write("over budget: " + ", ".join(sorted(over)) + "\n")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# coding: utf-8
+
+import math
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+from kivy.clock import Clock
+from kivy.graphics import Color, Line, Rectangle
+from kivy.graphics.texture import Texture
+from kivy.uix.widget import Widget
+
+from blocks.block_status import BlockStatus
+
+TILE_SIZE = 512  # 1 tile が覆う CodeArea 上の大きさ
+TILE_PIXELS = 32  # 1 tile の texture の大きさ
+MAX_TILES = 256  # 表示, 保持する texture の最大数. 超える場合は 2x2 の tile を 1 つにまとめる
+
+BACKGROUND = (40, 40, 40, 255)
+BLOCK_COLORS = {
+    BlockStatus.Function: (255, 0, 0, 255),  # 赤
+    BlockStatus.Argument: (0, 255, 0, 255),  # 緑
+    BlockStatus.Nest: (0, 0, 255, 255),  # 青
+    BlockStatus.Declare: (128, 77, 179, 255),  # 紫
+    BlockStatus.Call: (255, 255, 0, 255),  # 黄
+}
+
+
+class Minimap(Widget):
+    # CodeArea 全体の縮小図. Block を tile 単位の texture に描き, 変化した tile だけ描き直す
+    # tile が MAX_TILES より多ければ, 2^level x 2^level の tile を 1 枚の texture に粗く描く
+    def __init__(self, **kwargs):
+        super(Minimap, self).__init__(**kwargs)
+
+        self.code_area = None  # 表示中の CodeArea
+
+        self.block_tiles = {}  # Block -> Block が重なる tile
+        self.tile_blocks = defaultdict(set)  # tile -> tile に重なる Block
+        self.textures = OrderedDict()  # (level, まとめた tile) -> texture. 古いものから捨てる
+        self.dirty_tiles = set()
+
+        self.level = 0  # まとめる tile の段数
+        self.origin = (0, 0)  # 左下のまとめた tile
+        self.scale = 1.0  # texture 1 pixel あたりの Widget 上の大きさ
+
+        self.redraw_trigger = Clock.create_trigger(self.redraw)
+        self.bind(pos=self.redraw_trigger, size=self.redraw_trigger)
+
+    @staticmethod
+    def tiles_of(box):
+        x0, y0, x1, y1 = box
+        return set(
+            (tx, ty)
+            for tx in range(int(math.floor(x0 / TILE_SIZE)), int(math.floor(x1 / TILE_SIZE)) + 1)
+            for ty in range(int(math.floor(y0 / TILE_SIZE)), int(math.floor(y1 / TILE_SIZE)) + 1)
+        )
+
+    def update_blocks(self, blocks):
+        # 作成, 移動された Block の tile を描き直す
+        for block in blocks:
+            old_tiles = self.block_tiles.get(block, set())
+            new_tiles = self.tiles_of(block.bounding_box())
+
+            for tile in old_tiles - new_tiles:
+                self.tile_blocks[tile].discard(block)
+                if not self.tile_blocks[tile]:
+                    del self.tile_blocks[tile]
+            for tile in new_tiles:
+                self.tile_blocks[tile].add(block)
+
+            self.block_tiles[block] = new_tiles
+            self.dirty_tiles |= old_tiles | new_tiles
+
+        self.redraw_trigger()
+
+    def clear(self):
+        self.block_tiles = {}
+        self.tile_blocks = defaultdict(set)
+        self.textures = OrderedDict()
+        self.dirty_tiles = set()
+        self.redraw_trigger()
+
+    @staticmethod
+    def merge_tiles(tiles, level):
+        # tile をまとめた tile -> 含まれる tile
+        merged = defaultdict(list)
+        for tile in tiles:
+            merged[(tile[0] >> level, tile[1] >> level)].append(tile)
+        return merged
+
+    def tile_pixels(self, tile, tiles):
+        # tile は self.level でまとめた tile. tiles はそれに含まれる tile
+        pixels = np.empty((TILE_PIXELS, TILE_PIXELS, 4), dtype=np.uint8)
+        pixels[:] = BACKGROUND
+
+        tile_size = TILE_SIZE << self.level
+        tile_x, tile_y = tile[0] * tile_size, tile[1] * tile_size
+        ratio = TILE_PIXELS / float(tile_size)
+        blocks = set()
+        for base_tile in tiles:
+            blocks |= self.tile_blocks.get(base_tile, set())
+        for block in blocks:
+            x0, y0, x1, y1 = block.bounding_box()
+            px0 = max(int((x0 - tile_x) * ratio), 0)
+            py0 = max(int((y0 - tile_y) * ratio), 0)
+            px1 = min(int(math.ceil((x1 - tile_x) * ratio)), TILE_PIXELS)
+            py1 = min(int(math.ceil((y1 - tile_y) * ratio)), TILE_PIXELS)
+            if px0 < px1 and py0 < py1:
+                pixels[py0:py1, px0:px1] = BLOCK_COLORS[block.status]
+
+        return pixels
+
+    def render_tile(self, tile, tiles):
+        pixels = self.tile_pixels(tile, tiles)
+
+        key = (self.level, tile)
+        texture = self.textures.pop(key, None)
+        if texture is None:
+            texture = Texture.create(size=(TILE_PIXELS, TILE_PIXELS), colorfmt="rgba")
+        texture.blit_buffer(pixels.tobytes(), colorfmt="rgba", bufferfmt="ubyte")
+        self.textures[key] = texture
+
+        while len(self.textures) > MAX_TILES:
+            self.textures.popitem(last=False)
+
+    def redraw(self, *args):
+        self.canvas.clear()
+        if not self.tile_blocks:
+            self.dirty_tiles = set()
+            return
+
+        # 表示する texture が MAX_TILES 以下になるまで tile をまとめる. Block は省かない
+        level = 0
+        merged = self.merge_tiles(self.tile_blocks, level)
+        while len(merged) > MAX_TILES:
+            level += 1
+            merged = self.merge_tiles(merged, 1)
+        if level != self.level:
+            self.level = level
+            self.textures = OrderedDict()
+        if level > 0:
+            merged = self.merge_tiles(self.tile_blocks, level)
+
+        # Block のある範囲を Widget に収める
+        xs = [tile[0] for tile in merged]
+        ys = [tile[1] for tile in merged]
+        columns = max(xs) - min(xs) + 1
+        rows = max(ys) - min(ys) + 1
+        self.origin = (min(xs), min(ys))
+        self.scale = min(self.width / float(columns * TILE_PIXELS),
+                         self.height / float(rows * TILE_PIXELS))
+        tile_length = TILE_PIXELS * self.scale
+
+        dirty = set((tile[0] >> level, tile[1] >> level) for tile in self.dirty_tiles)
+        for tile, tiles in merged.items():
+            if tile in dirty or (level, tile) not in self.textures:
+                self.render_tile(tile, tiles)
+        self.dirty_tiles = set()
+
+        with self.canvas:
+            Color(1, 1, 1)
+            for tile in merged:
+                Rectangle(texture=self.textures[(level, tile)], size=(tile_length, tile_length),
+                          pos=(self.x + (tile[0] - self.origin[0]) * tile_length,
+                               self.y + (tile[1] - self.origin[1]) * tile_length))
+
+            # CodeArea に表示している範囲
+            if self.code_area is not None:
+                x0, y0, x1, y1 = self.code_area.view_box()
+                p0 = self.to_minimap(x0, y0)
+                p1 = self.to_minimap(x1, y1)
+                Color(1, 1, 1, 0.8)
+                Line(rectangle=(p0[0], p0[1], p1[0] - p0[0], p1[1] - p0[1]))
+
+    def to_minimap(self, x, y):
+        tile_size = TILE_SIZE << self.level
+        ratio = self.scale * TILE_PIXELS / float(tile_size)
+        return (self.x + (x - self.origin[0] * tile_size) * ratio,
+                self.y + (y - self.origin[1] * tile_size) * ratio)
+
+    def to_code_area(self, x, y):
+        tile_size = TILE_SIZE << self.level
+        ratio = self.scale * TILE_PIXELS / float(tile_size)
+        return ((x - self.x) / ratio + self.origin[0] * tile_size,
+                (y - self.y) / ratio + self.origin[1] * tile_size)
+
+    def on_touch_down(self, touch):
+        if self.collide_point(*touch.pos) and self.code_area is not None and self.tile_blocks:
+            self.code_area.jump_to(*self.to_code_area(*touch.pos))
+            self.redraw_trigger()
+            return True
+
+        return super(Minimap, self).on_touch_down(touch)
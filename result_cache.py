@@ -0,0 +1,82 @@
+# coding: utf-8
+
+import os
+import json
+import hashlib
+from collections import OrderedDict
+
+
+class ResultCache:
+    # 生成した code をキーに, 実行結果を LRU で保持する
+    def __init__(self, max_entries=128, max_bytes=4 * 1024 * 1024, directory=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory  # None でなければ disk にも保存する
+
+        self.entries = OrderedDict()  # key -> (code, results)
+        self.size = 0  # 保持している文字数
+
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    @staticmethod
+    def key(scripts):
+        digest = hashlib.sha256()
+        for script in scripts:
+            digest.update(script.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @staticmethod
+    def entry_size(entry):
+        code, results = entry
+        return len(code) + sum(len(result) for result in results)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            return entry
+
+        if self.directory is None:
+            return None
+
+        try:
+            with open(os.path.join(self.directory, key + ".json")) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        entry = (data["code"], data["results"])
+        self.store(key, entry)
+        return entry
+
+    def put(self, key, code, results):
+        entry = (code, list(results))
+        self.store(key, entry)
+
+        if self.directory is not None:
+            path = os.path.join(self.directory, key + ".json")
+            with open(path + ".tmp", "w") as f:
+                json.dump({"code": code, "results": entry[1]}, f)
+            os.replace(path + ".tmp", path)
+
+    def store(self, key, entry):
+        if key in self.entries:
+            self.size -= self.entry_size(self.entries.pop(key))
+
+        size = self.entry_size(entry)
+        if size > self.max_bytes:
+            return
+
+        self.entries[key] = entry
+        self.size += size
+
+        # 古いものから捨てる
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            _, old = self.entries.popitem(last=False)
+            self.size -= self.entry_size(old)
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
@@ -0,0 +1,38 @@
+# coding: utf-8
+
+import os
+import sys
+
+import pytest
+
+# window を作らず, Kivy に pytest の引数を解釈させない
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+os.environ.setdefault("KIVY_NO_CONSOLELOG", "1")
+os.environ.setdefault("KIVY_GL_BACKEND", "mock")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def code_area():
+    # App を起動せず, 表示先の Widget を直接持つ CodeArea
+    pytest.importorskip("kivy")
+    import main
+    from kivy.uix.boxlayout import BoxLayout
+    from kivy.uix.textinput import TextInput
+    from minimap import Minimap
+
+    class PanelCodeArea(main.CodeArea):
+        panel = None
+
+    area = PanelCodeArea()
+    exec_area = BoxLayout()
+    exec_area.add_widget(TextInput())
+    area.panel = {"minimap": Minimap(size=(100, 100)), "ti_code": TextInput(),
+                  "ti_exec": exec_area.children[0], "exec_area": exec_area}
+    area.panel["minimap"].code_area = area
+
+    yield area
+
+    area.cancel_run()
+    area.stop_collab()
@@ -0,0 +1,96 @@
+# coding: utf-8
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("kivy")
+
+import cli
+from blocks.concrete_block import ConcreteBlock
+from blocks.serializer import load_blocks
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def chain(*items):
+    # (種類, 文字列, 引数の文字列) の列を next で繋いだ program
+    blocks = []
+    previous = None
+    for block_type, text, elem in items:
+        index = len(blocks)
+        blocks.append({"type": block_type, "x": 0, "y": 0, "text": text,
+                       "next": None, "elem": index + 1, "nest": None})
+        blocks.append({"type": "ArgumentBlock", "x": 0, "y": 0, "text": elem,
+                       "next": None, "elem": None, "nest": None})
+        if previous is not None:
+            blocks[previous]["next"] = index
+        previous = index
+    return {"blocks": blocks}
+
+
+def write(tmp_path, name, program):
+    path = tmp_path / (name + ".json")
+    path.write_text(json.dumps(program))
+    return str(path)
+
+
+def test_compile_matches_make_code(tmp_path, capsys):
+    program = chain(("DeclareBlock", "n", "2"), ("PrintBlock", "", "n * 3"))
+    path = write(tmp_path, "program", program)
+
+    assert cli.main(["compile", path, path]) == 0
+
+    codes = load_blocks(program, draw=False)
+    code = ConcreteBlock.make_chain_code(ConcreteBlock.find_heads(codes)[0], "", 0)[0]
+    assert code == "n = 2\nprint(n * 3)\n"
+    assert capsys.readouterr().out == ("# === " + path + " ===\n" + code) * 2
+
+
+def test_compile_reports_invalid_program(tmp_path, capsys):
+    path = write(tmp_path, "invalid", chain(("PrintBlock", "", "1 +")))
+
+    assert cli.main(["compile", path]) == 1
+    assert "not valid Python" in capsys.readouterr().err
+
+
+def test_run_writes_json_lines(tmp_path):
+    ok = write(tmp_path, "ok", chain(("PrintBlock", "", "'a', 'b', sep='-'")))
+    output = str(tmp_path / "results.jsonl")
+
+    assert cli.main(["run", ok, "--jobs", "1", "--output", output]) == 0
+
+    with open(output) as f:
+        records = [json.loads(line) for line in f]
+    assert records == [{"program": ok, "errors": "", "chains": [
+        {"output": "a-b\n", "error": "", "timeout": False, "code": "print('a', 'b', sep='-')\n"}
+    ]}]
+
+
+def test_run_fails_on_errors_and_timeouts(tmp_path):
+    ok = write(tmp_path, "ok", chain(("PrintBlock", "", "1")))
+    raises = write(tmp_path, "raises", chain(("PrintBlock", "", "1 / 0")))
+    loops = write(tmp_path, "loops", chain(("DeclareBlock", "x", "[1 for _ in iter(int, 1)]")))
+    invalid = write(tmp_path, "invalid", chain(("PrintBlock", "", "1 +")))
+    output = str(tmp_path / "results.jsonl")
+
+    assert cli.main(["run", ok, "--jobs", "1", "--output", output]) == 0
+    for path in (raises, invalid):
+        assert cli.main(["run", path, "--jobs", "1", "--output", output]) == 1
+    assert cli.main(["run", loops, "--jobs", "1", "--timeout", "0.2", "--output", output]) == 1
+
+    with open(output) as f:
+        record = json.loads(f.readline())
+    assert record["chains"][0]["timeout"]
+
+
+def test_exit_status_of_script(tmp_path):
+    path = write(tmp_path, "raises", chain(("PrintBlock", "", "1 / 0")))
+    result = subprocess.run([sys.executable, os.path.join(ROOT, "cli.py"), "run", path, "--jobs", "1"],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=60)
+
+    assert result.returncode == 1
+    assert "ZeroDivisionError" in json.loads(result.stdout)["chains"][0]["error"]
@@ -0,0 +1,382 @@
+# coding: utf-8
+
+import time
+import random
+import socket
+import functools
+from concurrent.futures import Future
+
+import pytest
+
+pytest.importorskip("kivy")
+
+from kivy.clock import Clock
+
+import executor
+import exporter
+import main
+from blocks.function_block import PrintBlock
+from result_cache import ResultCache
+
+
+@pytest.fixture
+def module_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(exporter, "export_module",
+                        functools.partial(exporter.export_module, directory=str(tmp_path)))
+    yield tmp_path
+    executor.shutdown()
+
+
+def test_execute_without_selection_shows_hint(code_area):
+    code_area.exec_block()
+    assert code_area.panel["ti_exec"].text == "No block to run"
+
+    code_area.add_block(PrintBlock, 0, 0)
+    code_area.add_block(PrintBlock, 500, 0)
+    code_area.exec_block()
+    assert code_area.panel["ti_exec"].text == "Select a chain or use Run All"
+    assert code_area.run_event is None
+
+
+def test_new_run_supersedes_previous(code_area, module_dir):
+    code_area.add_block(PrintBlock, 0, 0)
+    code_area.add_block(PrintBlock, 500, 0)
+
+    code_area.exec_block(run_all=True)
+    first_event, first_futures = code_area.run_event, code_area.run_futures
+    assert len(first_futures) == 2
+
+    code_area.exec_block(run_all=True)
+    assert code_area.run_event is not first_event
+    assert not first_event.is_triggered
+    assert code_area.run_futures is not first_futures
+
+    code_area.cancel_run()
+    assert code_area.run_event is None and code_area.run_futures == []
+
+
+def finished(*results):
+    # すでに終わった Future. Exception なら worker の失敗とする
+    futures = []
+    for result in results:
+        future = Future()
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+        futures.append(future)
+    return futures
+
+
+def run_until_shown(code_area):
+    deadline = time.time() + 5
+    while code_area.run_event is not None and time.time() < deadline:
+        time.sleep(0.06)
+        Clock.tick()
+
+
+@pytest.mark.parametrize("result, cached", [
+    ({"output": "ok\n", "error": "", "timeout": False}, True),
+    ({"output": "", "error": "Timeout: exceeded 5.0 seconds\n", "timeout": True}, False),
+    (RuntimeError("worker died"), False),
+])
+def test_only_real_results_are_cached(code_area, module_dir, monkeypatch, result, cached):
+    monkeypatch.setattr(main.CodeArea, "use_result_cache", True)
+    monkeypatch.setattr(main.CodeArea, "result_cache", ResultCache())
+    monkeypatch.setattr(executor, "submit_files", lambda paths, timeout=None: finished(result))
+
+    code_area.add_block(PrintBlock, 0, 0)
+    code_area.exec_block(run_all=True)
+    run_until_shown(code_area)
+
+    shown = code_area.panel["ti_exec"].text
+    if isinstance(result, Exception):
+        assert shown.startswith("worker error: RuntimeError")
+    else:
+        assert shown == result["output"] + result["error"]
+    assert (len(main.CodeArea.result_cache.entries) == 1) == cached
+
+
+def test_collab_errors_are_shown(code_area):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+        # 誰も待ち受けていない port には Join できない
+        code_area.start_collab(port=port)
+        assert code_area.collab is None
+        assert code_area.panel["ti_exec"].text.startswith("Collab failed:")
+
+        # 使用中の port では Host できない
+        sock.listen()
+        code_area.panel["ti_exec"].text = ""
+        code_area.start_collab(serve=True, port=port)
+        assert code_area.collab is None
+        assert code_area.panel["ti_exec"].text.startswith("Collab failed:")
+
+
+class QueuedClient:
+    # 受信済みの操作をそのまま返す SyncClient の代わり
+    def __init__(self, ops):
+        self.ops = list(ops)
+
+    def poll(self):
+        ops, self.ops = self.ops, []
+        return ops
+
+    def close(self):
+        pass
+
+
+def remote_ops():
+    def op(kind, block_id, clock, site, x, y, next_id=None, **extra):
+        result = {"op": kind, "id": block_id, "clock": clock, "site": site,
+                  "x": x, "y": y, "next": next_id, "elem": None, "nest": None}
+        result.update(extra)
+        return result
+
+    return [
+        op("add", "s:1", 1, "s", 0.0, 0.0, type="PrintBlock", text=""),
+        op("add", "s:2", 2, "s", 0.0, -50.0, type="PrintBlock", text=""),
+        op("add", "s:3", 3, "s", 300.0, 0.0, type="PrintBlock", text=""),
+        # s は s:2 を s:1 の下に繋いで動かし, t は同時に s:2 を s:3 の下へ動かす
+        op("state", "s:1", 4, "s", 10.0, 0.0, next_id="s:2"),
+        op("state", "s:2", 5, "s", 10.0, -50.0),
+        op("state", "s:3", 4, "t", 300.0, 0.0, next_id="s:2"),
+        op("state", "s:2", 5, "t", 300.0, -50.0),
+    ]
+
+
+def layout(code_area):
+    result = {}
+    for block_id, block in code_area.blocks_by_id.items():
+        result[block_id] = (tuple(block.block_start_point.point),
+                            None if block.back_block is None else block.back_block.block_id)
+    return result
+
+
+def test_apply_remote_relinks_in_any_order(code_area):
+    ops = remote_ops()
+    code_area.collab = QueuedClient(ops)
+    code_area.apply_remote(0)
+    expected = layout(code_area)
+
+    # s:3 の state の stamp (4, "t") が s:1 の (4, "s") より新しいので s:2 は s:3 に繋がる
+    assert expected["s:2"] == ((300.0, -50.0), "s:3")
+    assert expected["s:1"] == ((10.0, 0.0), None)
+    assert code_area.blocks_by_id["s:3"].next_block is code_area.blocks_by_id["s:2"]
+    assert code_area.blocks_by_id["s:1"].next_block is None
+    assert set(code_area.heads) == {code_area.blocks_by_id["s:1"], code_area.blocks_by_id["s:3"]}
+
+    for seed in range(3):
+        other = type(code_area)()
+        other.panel = code_area.panel
+        shuffled = list(ops)
+        random.Random(seed).shuffle(shuffled)
+        other.collab = QueuedClient(shuffled)
+        other.apply_remote(0)
+        assert layout(other) == expected
+
+
+class FakeTouch:
+    # CodeArea の touch 処理に必要なものだけを持つ MotionEvent の代わり
+    profile = ["pos", "button"]
+
+    def __init__(self, x, y, button="left"):
+        self.pos = (x, y)
+        self.button = button
+
+    def push(self):
+        pass
+
+    def pop(self):
+        pass
+
+    def apply_transform_2d(self, transform):
+        self.pos = transform(*self.pos)
+
+
+def make_chain(code_area, count, x=0.0, y=0.0):
+    blocks = [code_area.add_block(PrintBlock, x, y)]
+    for _ in range(count - 1):
+        block = code_area.add_block(PrintBlock, x + 400, y)
+        blocks[-1].attach("next", block)
+        blocks.append(block)
+    code_area.update_heads()
+    code_area.notify_moved()
+    return blocks
+
+
+def start_of(block):
+    return tuple(block.block_start_point.point)
+
+
+def test_connect_selection_cuts_and_reconnects_at_boundary(code_area):
+    a, b, c = make_chain(code_area, 3)
+    b_start, c_start = start_of(b), start_of(c)
+
+    # b だけを離すと, a -> b と b -> c が切れる
+    code_area.select_blocks([b])
+    b.translate(-500, 0)
+    code_area.connect_selection()
+    code_area.notify_moved()
+    assert a.next_block is None and b.back_block is None and b.next_block is None
+    assert c.back_block is None and start_of(c) == c_start
+    assert set(code_area.heads) == {a, b, c}
+    assert a.dirty and b.dirty and c.dirty
+
+    # 元の位置の近くに戻すと, b は a に, 外の先頭の c は b に繋がる
+    b.translate(500 - 5, 3)
+    code_area.connect_selection()
+    assert a.next_block is b and b.next_block is c
+    assert start_of(b) == b_start and start_of(c) == c_start
+    assert code_area.heads == [a]
+
+
+def test_connect_selection_keeps_links_inside_selection(code_area):
+    a, b, c = make_chain(code_area, 3)
+
+    code_area.select_blocks([b, c])
+    for block in (b, c):
+        block.translate(-500, 0)
+    code_area.connect_selection()
+
+    assert a.next_block is None
+    assert b.next_block is c and c.back_block is b
+    assert set(code_area.heads) == {a, b}
+
+
+def test_paste_copies_structure_with_offset(code_area):
+    a, b = make_chain(code_area, 2)
+    a.breakpoint = True
+
+    code_area.select_blocks([a, b])
+    code_area.copy_blocks()
+    code_area.paste_blocks()
+
+    pasted = [block for block in code_area.codes if block not in (a, b)]
+    assert len(pasted) == 2
+    copy_a, copy_b = sorted(pasted, key=lambda block: block.back_block is not None)
+    assert copy_a.next_block is copy_b and copy_b.back_block is copy_a
+    assert copy_a.breakpoint and copy_a.block_id is None
+    assert start_of(copy_a) == (a.block_start_point.x + 30, a.block_start_point.y - 30)
+    assert code_area.selection == {copy_a, copy_b}
+    assert set(code_area.heads) == {a, copy_a}
+    assert code_area.port_index.block_cells.keys() >= {copy_a, copy_b}
+
+
+def test_group_drag_moves_once_per_frame(code_area):
+    a, b = make_chain(code_area, 2)
+    far = code_area.add_block(PrintBlock, 2000.0, 2000.0)
+    code_area.select_blocks([far])
+    start = start_of(far)
+
+    moves = []
+    original = type(far).translate
+    far.translate = lambda dx, dy: moves.append((dx, dy)) or original(far, dx, dy)
+
+    code_area.on_touch_down(FakeTouch(2010, 1990))
+    for step in range(1, 6):
+        code_area.on_touch_move(FakeTouch(2010 + 10 * step, 1990))
+    assert moves == []  # frame が来るまでは動かさない
+
+    Clock.tick()
+    assert moves == [(-50, 0)]
+
+    code_area.on_touch_move(FakeTouch(2070, 1990))
+    code_area.on_touch_up(FakeTouch(2070, 1990))
+    assert moves == [(-50, 0), (-10, 0)]
+    assert start_of(far) == (start[0] + 60, start[1])
+    assert code_area.group_drag is None
+
+
+def test_drag_moves_once_per_frame_and_previews_snap(code_area):
+    parent = code_area.add_block(PrintBlock, 0.0, 0.0)
+    block = code_area.add_block(PrintBlock, 1000.0, 0.0)
+
+    moves = []
+    original = type(block).move
+    block.move = lambda dx, dy: moves.append((dx, dy)) or original(block, dx, dy)
+    previews = []
+    block.on_drag = lambda dragged: previews.append(code_area.nearest_port(dragged))
+
+    # parent の next の接続点の近くまで 4 回に分けて drag する
+    end = parent.port_point("next")
+    x, y = 1010.0, -10.0
+    code_area.on_touch_down(FakeTouch(x, y))
+    assert code_area.drag_block is block
+    target_x, target_y = x + float(end.x - block.block_start_point.x) + 3, y + float(end.y - block.block_start_point.y)
+    for step in range(1, 5):
+        code_area.on_touch_move(FakeTouch(x + (target_x - x) * step / 4, y + (target_y - y) * step / 4))
+    assert moves == []
+
+    Clock.tick()
+    assert len(moves) == 1
+    assert previews == [(parent, "next")]
+
+    # 離すと, 反映していない移動はなく, 接続点へ寄せる移動だけが起きる
+    code_area.on_touch_up(FakeTouch(target_x, target_y))
+    assert block.pending_move == (0, 0)
+    assert moves[1] == pytest.approx((3, 0))
+    assert parent.next_block is block
+    assert start_of(block) == tuple(parent.port_point("next").point)
+
+
+def test_drop_matches_preview_at_occupied_port(code_area):
+    parent, child = make_chain(code_area, 2)
+    block = code_area.add_block(PrintBlock, 1000.0, 0.0)
+    previews = []
+    block.on_drag = lambda dragged: previews.append(code_area.nearest_port(dragged))
+
+    # child が繋がっている parent の next の接続点の近くへ drag する
+    end = parent.port_point("next")
+    x, y = 1010.0, -10.0
+    code_area.on_touch_down(FakeTouch(x, y))
+    target_x, target_y = x + float(end.x - block.block_start_point.x) + 3, y + float(end.y - block.block_start_point.y)
+    code_area.on_touch_move(FakeTouch(target_x, target_y))
+    Clock.tick()
+    dropped = start_of(block)
+
+    # preview が出ないなら, 離しても繋がらず, 寄せる移動もない
+    code_area.on_touch_up(FakeTouch(target_x, target_y))
+    assert previews[-1] is None
+    assert parent.next_block is child and child.back_block is parent
+    assert block.back_block is None
+    assert start_of(block) == dropped
+    assert set(code_area.heads) == {parent, block}
+
+
+def test_drop_detaches_dragged_chain(code_area):
+    a, b, c = make_chain(code_area, 3)
+
+    # b を c ごと遠くへ drag すると, a との接続だけが切れる
+    x, y = b.block_start_point.x + 10, b.block_start_point.y - 10
+    code_area.on_touch_down(FakeTouch(x, y))
+    assert code_area.drag_block is b
+    code_area.on_touch_move(FakeTouch(x + 1000, y))
+    code_area.on_touch_up(FakeTouch(x + 1000, y))
+
+    assert a.next_block is None and b.back_block is None
+    assert b.next_block is c and c.back_block is b
+    assert set(code_area.heads) == {a, b}
+    assert code_area.drag_chain == set()
+
+
+def test_marks_do_not_erase_each_other(code_area):
+    block = code_area.add_block(PrintBlock, 0.0, 0.0)
+    breakpoint_color = (0.6, 0, 0.8, 0.4)
+
+    block.mark("breakpoint", breakpoint_color)
+    code_area.select_blocks([block])
+    code_area.show_snap_target((block, "next"))
+    assert tuple(block.mark_color.rgba) == pytest.approx((0, 1, 0, 0.4))
+
+    code_area.show_snap_target(None)
+    assert tuple(block.mark_color.rgba) == pytest.approx((0.3, 0.6, 1, 0.4))
+
+    code_area.select_blocks([])
+    assert tuple(block.mark_color.rgba) == pytest.approx(breakpoint_color)
+
+    block.mark("breakpoint", None)
+    assert block.mark_color.a == 0
+    assert block.marks == {}
@@ -0,0 +1,138 @@
+# coding: utf-8
+
+import time
+import random
+import socket
+
+import pytest
+
+from collab import SyncClient, SyncServer, merge_state, resolve_links
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def receive(client, count, timeout=5):
+    ops = []
+    deadline = time.time() + timeout
+    while len(ops) < count and time.time() < deadline:
+        ops.extend(client.poll())
+        time.sleep(0.01)
+    return ops
+
+
+def state(x, y, next_id=None, elem=None, nest=None):
+    return {"x": x, "y": y, "next": next_id, "elem": elem, "nest": nest}
+
+
+def test_resolve_links_prefers_newest_parent():
+    states = {
+        "a": ((1, "s"), state(0, 0, next_id="c")),
+        "b": ((2, "t"), state(0, 100, next_id="c")),
+        "c": ((1, "s"), state(0, 50)),
+    }
+    assert resolve_links(states) == {"b": {"next": "c"}}
+
+
+def test_resolve_links_cuts_cycles():
+    states = {
+        "a": ((3, "s"), state(0, 0, next_id="b")),
+        "b": ((2, "s"), state(0, 0, next_id="a")),
+    }
+    assert resolve_links(states) == {"a": {"next": "b"}}
+
+
+def test_resolve_links_ignores_unknown_blocks():
+    states = {"a": ((1, "s"), state(0, 0, next_id="missing", elem="a"))}
+    assert resolve_links(states) == {}
+
+
+def test_group_move_relay_converges():
+    # 2 つの client が同時に選択範囲を動かしても, 全員が同じ state と接続になる
+    port = free_port()
+    server = SyncServer(port=port)
+    server.start_in_thread()
+
+    a = SyncClient(port=port)
+    b = SyncClient(port=port)
+    c = SyncClient(port=port)
+
+    adds = [
+        {"op": "add", "id": "p", "type": "PrintBlock", "text": ""},
+        {"op": "add", "id": "q", "type": "PrintBlock", "text": ""},
+        {"op": "add", "id": "r", "type": "PrintBlock", "text": ""},
+    ]
+    for op, position in zip(adds, [state(0, 0), state(0, -50), state(300, 0)]):
+        op.update(position)
+        a.send(op)
+    receive(b, 3)
+    receive(c, 3)
+
+    # a は q を p の下に繋いだまま 2 つを動かし, b は同時に q を r の下へ動かす
+    sent_a = [{"op": "state", "id": "p", **state(10, 0, next_id="q")},
+              {"op": "state", "id": "q", **state(10, -50)}]
+    sent_b = [{"op": "state", "id": "r", **state(300, 0, next_id="q")},
+              {"op": "state", "id": "q", **state(300, -50)}]
+    for op in sent_a:
+        a.send(op)
+    for op in sent_b:
+        b.send(op)
+
+    views = []
+    for client, own in ((a, sent_a), (b, sent_b), (c, [])):
+        ops = list(own) + receive(client, 4 - len(own))
+        states = {}
+        for op in adds + ops:
+            merge_state(states, op)
+        views.append((states, resolve_links(states)))
+
+    assert views[0] == views[1] == views[2]
+    states, links = views[0]
+    assert sum(1 for children in links.values() if "q" in children.values()) == 1
+
+    # 操作の順序を変えても結果は同じ
+    ops = adds + sent_a + sent_b
+    for _ in range(5):
+        random.shuffle(ops)
+        shuffled = {}
+        for op in ops:
+            merge_state(shuffled, op)
+        assert resolve_links(shuffled) == links
+
+    # 途中から参加した client には, Block ごとの最新の操作だけが送られる
+    d = SyncClient(port=port)
+    replay = receive(d, 6)
+    time.sleep(0.1)
+    replay.extend(d.poll())
+    assert len(replay) == len(server.log) == 6
+    late = {}
+    for op in replay:
+        merge_state(late, op)
+    assert late == states
+
+    for client in (a, b, c, d):
+        client.close()
+
+
+def test_start_in_thread_reports_busy_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        server = SyncServer(port=sock.getsockname()[1])
+
+        with pytest.raises(OSError):
+            server.start_in_thread()
+
+
+def test_merge_state_keeps_newest():
+    states = {}
+    newer = {"op": "state", "id": "a", "clock": 2, "site": "s", **state(10, 0)}
+    older = {"op": "add", "id": "a", "clock": 1, "site": "t", "type": "PrintBlock", "text": "", **state(0, 0)}
+
+    assert merge_state(states, newer)
+    assert not merge_state(states, older)
+    assert not merge_state(states, dict(newer))
+    assert states == {"a": ((2, "s"), state(10, 0))}
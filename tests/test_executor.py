@@ -0,0 +1,98 @@
+# coding: utf-8
+
+import executor
+import exporter
+
+
+def test_compile_cache_evicts_oldest(monkeypatch):
+    monkeypatch.setattr(executor, "CODE_CACHE_SIZE", 2)
+    monkeypatch.setattr(executor, "_code_cache", executor.OrderedDict())
+
+    first = executor.compile_script("a = 1\n")
+    executor.compile_script("b = 1\n")
+    assert executor.compile_script("a = 1\n") is first
+
+    executor.compile_script("c = 1\n")
+    assert list(executor._code_cache) == [("<string>", "a = 1\n"), ("<string>", "c = 1\n")]
+
+
+def test_submitted_files_time_out(tmp_path):
+    paths = [exporter.export_module("while True:\n    pass\n", str(tmp_path)),
+             exporter.export_module("print('done')\n", str(tmp_path))]
+    try:
+        looping, done = [future.result(30) for future in executor.submit_files(paths, 0.5)]
+    finally:
+        executor.shutdown()
+
+    assert looping["timeout"]
+    assert done == {"output": "done\n", "error": "", "timeout": False}
+
+
+def test_timeout_is_not_swallowed_by_user_code():
+    result = executor.execute_script(
+        "try:\n"
+        "    while True:\n"
+        "        pass\n"
+        "except Exception:\n"
+        "    print('swallowed')\n",
+        timeout=0.2
+    )
+
+    assert result["timeout"]
+    assert "swallowed" not in result["output"]
+
+
+def test_timeout_fires_again_after_bare_except():
+    for handler in ("except:", "except BaseException:"):
+        result = executor.execute_script(
+            "import time\n"
+            "try:\n"
+            "    while True:\n"
+            "        time.sleep(0.01)\n"
+            + handler + "\n"
+            "    print('swallowed')\n"
+            "while True:\n"
+            "    time.sleep(0.01)\n",
+            timeout=0.2
+        )
+
+        assert result["timeout"], handler
+        assert result["output"] == "swallowed\n"
+        assert result["error"].startswith("Timeout")
+
+
+def test_caught_timeout_is_still_reported():
+    result = executor.execute_script(
+        "try:\n"
+        "    while True:\n"
+        "        pass\n"
+        "except BaseException:\n"
+        "    pass\n",
+        timeout=0.2
+    )
+
+    assert result["timeout"]
+
+
+def test_fast_script_is_not_timed_out():
+    result = executor.execute_script("print(1)\n", timeout=5)
+    assert result == {"output": "1\n", "error": "", "timeout": False}
+
+
+def test_traceback_starts_at_the_program(tmp_path):
+    path = exporter.export_module("def f():\n    return 1 / 0\n\nf()\n", str(tmp_path))
+    error = executor.execute_file(path)["error"]
+
+    assert error.startswith("Traceback (most recent call last):\n  File \"" + path + "\", line 4")
+    assert "executor.py" not in error and "ZeroDivisionError" in error
+
+    error = executor.execute_script("raise ValueError('x')\n")["error"]
+    assert error.splitlines()[1].startswith('  File "<string>", line 1')
+
+
+def test_syntax_error_shows_no_harness_frames(tmp_path):
+    path = exporter.export_module("print(1 +)\n", str(tmp_path))
+    error = executor.execute_file(path)["error"]
+
+    assert "SyntaxError" in error
+    assert "executor.py" not in error and "exporter.py" not in error
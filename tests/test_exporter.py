@@ -0,0 +1,78 @@
+# coding: utf-8
+
+import os
+import py_compile
+import importlib.util
+
+import exporter
+
+
+def test_same_source_reuses_module(tmp_path, monkeypatch):
+    source = "print(1 + 1)\n"
+    path = exporter.export_module(source, str(tmp_path))
+    cfile = importlib.util.cache_from_source(path)
+    assert os.path.basename(path) == exporter.module_name(source) + ".py"
+    assert exporter.is_current(cfile, source.encode("utf-8"))
+    mtime = os.stat(path).st_mtime_ns
+
+    # 同じ内容なら書き直さず, compile もしない
+    def fail(*args, **kwargs):
+        raise AssertionError("recompiled an unchanged module")
+    monkeypatch.setattr(py_compile, "compile", fail)
+
+    assert exporter.export_module(source, str(tmp_path)) == path
+    assert os.stat(path).st_mtime_ns == mtime
+
+
+def test_changed_source_is_recompiled(tmp_path):
+    path = exporter.export_module("x = 1\n", str(tmp_path), "program")
+    cfile = importlib.util.cache_from_source(path)
+
+    assert exporter.export_module("x = 2\n", str(tmp_path), "program") == path
+    assert exporter.is_current(cfile, b"x = 2\n")
+    assert not exporter.is_current(cfile, b"x = 1\n")
+
+    namespace = {}
+    exec(exporter.load_code(path), namespace)
+    assert namespace["x"] == 2
+
+
+def test_different_sources_get_different_names():
+    assert exporter.module_name("print(1)\n") != exporter.module_name("print(2)\n")
+
+
+def test_syntax_error_is_reported_not_raised(tmp_path):
+    path = exporter.export_module("print(1 +)\n", str(tmp_path))
+
+    assert os.path.exists(path)
+    assert not os.path.exists(importlib.util.cache_from_source(path))
+    assert exporter.compile_error(path) is not None
+
+
+def test_compile_error_none_for_valid_module(tmp_path):
+    path = exporter.export_module("print(1)\n", str(tmp_path))
+    assert exporter.compile_error(path) is None
+
+
+def test_prune_keeps_only_used_modules(tmp_path):
+    old = exporter.export_module("print('old')\n", str(tmp_path))
+    kept = exporter.export_module("print('kept')\n", str(tmp_path))
+    program = exporter.export_module("print('program')\n", str(tmp_path), "program")
+
+    exporter.prune_modules([kept], str(tmp_path))
+
+    assert not os.path.exists(old)
+    assert not os.path.exists(importlib.util.cache_from_source(old))
+    assert os.path.exists(kept)
+    assert exporter.is_current(importlib.util.cache_from_source(kept), b"print('kept')\n")
+    # chain_<hash>.py 以外は消さない
+    assert os.path.exists(program)
+
+
+def test_default_directory_is_read_at_call_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(exporter, "MODULE_DIR", str(tmp_path))
+    path = exporter.export_module("x = 1\n")
+    assert os.path.dirname(path) == str(tmp_path)
+
+    exporter.prune_modules([])
+    assert not os.path.exists(path)
@@ -0,0 +1,70 @@
+# coding: utf-8
+
+import os
+import subprocess
+import sys
+import tracemalloc
+
+import pytest
+
+pytest.importorskip("kivy")
+
+import memory_report
+from blocks.argument_block import ArgumentBlock
+from blocks.function_block import PrintBlock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def tracing_off():
+    # 他の test が開始した tracemalloc を一時的に止める
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.stop()
+    yield
+    if tracing:
+        tracemalloc.start()
+
+
+def test_report_counts_blocks_per_type(code_area, tracing_off):
+    for x in (0.0, 500.0):
+        code_area.add_block(PrintBlock, x, 0.0)
+    code_area.add_block(ArgumentBlock, 1000.0, 0.0)
+
+    type_costs = {"PrintBlock": {"bytes_per_block": 100.0}}
+    result = memory_report.report(code_area, type_costs)
+
+    assert result["blocks"] == 3
+    assert result["blocks_per_type"] == {"PrintBlock": 2, "ArgumentBlock": 1}
+    # 測っていない種類は見積もらない
+    assert result["estimated_bytes_per_type"] == {"PrintBlock": 200}
+    assert result["widgets"] > 3 and result["instructions"] > 0
+    assert result["tracemalloc"] == "off"
+
+    text = memory_report.format_report(result)
+    assert "blocks: 3" in text
+    assert "blocks_per_type:\n  ArgumentBlock: 1\n  PrintBlock: 2" in text
+
+
+def test_report_traced_bytes(code_area, tracing_off):
+    tracemalloc.start()
+    try:
+        result = memory_report.report(code_area)
+    finally:
+        tracemalloc.stop()
+
+    assert "tracemalloc" not in result and "estimated_bytes_per_type" not in result
+    assert result["traced_peak_bytes"] >= result["traced_bytes"] > 0
+
+
+@pytest.mark.parametrize("budget, status", [("1", 1), ("100000000", 0)])
+def test_budget_exit_status(budget, status):
+    result = subprocess.run([sys.executable, os.path.join(ROOT, "memory_report.py"),
+                             "--blocks", "2", "--budget", budget],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True, timeout=120)
+
+    assert result.returncode == status
+    assert ("over budget: " in result.stderr) == bool(status)
+    assert "PrintBlock" in result.stdout
@@ -0,0 +1,108 @@
+# coding: utf-8
+
+import pytest
+
+pytest.importorskip("kivy")
+
+import minimap
+from blocks.block_status import BlockStatus
+from minimap import MAX_TILES, TILE_SIZE, Minimap
+
+
+class Box:
+    # bounding_box と status だけを持つ Block の代わり
+    status = BlockStatus.Function
+
+    def __init__(self, x, y):
+        self.box = (x, y, x + 100, y + 50)
+
+    def bounding_box(self):
+        return self.box
+
+
+def grid(count, spacing=TILE_SIZE + 88):
+    return [Box(i * spacing, j * spacing) for i in range(count) for j in range(count)]
+
+
+def test_one_texture_per_tile_when_few_tiles():
+    view = Minimap(size=(200, 200))
+    view.update_blocks(grid(4))
+    view.redraw()
+
+    assert view.level == 0
+    assert set(view.textures) == set((0, tile) for tile in view.tile_blocks)
+
+
+def test_tiles_are_merged_not_dropped():
+    view = Minimap(size=(200, 200))
+    blocks = grid(40)
+    view.update_blocks(blocks)
+    view.redraw()
+
+    assert len(view.tile_blocks) > MAX_TILES
+    assert view.level > 0
+    assert len(view.textures) <= MAX_TILES
+
+    # どの Block の tile もまとめた tile として描かれている
+    level = view.level
+    for block in blocks:
+        for tx, ty in view.block_tiles[block]:
+            assert (level, (tx >> level, ty >> level)) in view.textures
+
+    # 1 段細かければ MAX_TILES を超える
+    finer = set((tx >> (level - 1), ty >> (level - 1)) for tx, ty in view.tile_blocks)
+    assert len(finer) > MAX_TILES
+
+
+def test_only_dirty_merged_tiles_are_redrawn(monkeypatch):
+    view = Minimap(size=(200, 200))
+    blocks = grid(40)
+    view.update_blocks(blocks)
+    view.redraw()
+
+    rendered = []
+    original = Minimap.render_tile
+    monkeypatch.setattr(Minimap, "render_tile",
+                        lambda self, tile, tiles: rendered.append(tile) or original(self, tile, tiles))
+
+    block = blocks[0]
+    block.box = (block.box[0] + 10, block.box[1], block.box[2] + 10, block.box[3])
+    view.update_blocks([block])
+    view.redraw()
+
+    assert rendered == [(0, 0)]
+
+
+def test_coordinates_round_trip_at_every_level():
+    for count in (2, 40):
+        view = Minimap(pos=(5, 7), size=(200, 200))
+        view.update_blocks(grid(count))
+        view.redraw()
+
+        x, y = view.to_minimap(1234.0, -567.0)
+        assert view.to_code_area(x, y) == pytest.approx((1234.0, -567.0))
+
+
+def test_merged_tile_pixels_include_every_block():
+    view = Minimap(size=(200, 200))
+    blocks = grid(40)
+    view.update_blocks(blocks)
+    view.redraw()
+
+    # まとめた tile ごとに, 含まれる Block の左下の pixel が Block の色になる
+    level = view.level
+    tile_size = TILE_SIZE << level
+    ratio = minimap.TILE_PIXELS / float(tile_size)
+    merged = Minimap.merge_tiles(view.tile_blocks, level)
+    checked = 0
+    for tile, tiles in merged.items():
+        pixels = view.tile_pixels(tile, tiles)
+        for block in set().union(*(view.tile_blocks[base] for base in tiles)):
+            x0, y0 = block.box[0], block.box[1]
+            if (int(x0) // tile_size, int(y0) // tile_size) != tile:
+                continue
+            px, py = int((x0 - tile[0] * tile_size) * ratio), int((y0 - tile[1] * tile_size) * ratio)
+            assert tuple(pixels[py, px]) == minimap.BLOCK_COLORS[block.status]
+            checked += 1
+
+    assert checked == len(blocks)
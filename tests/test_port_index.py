@@ -0,0 +1,126 @@
+# coding: utf-8
+
+import pytest
+
+pytest.importorskip("kivy")
+
+from blocks import DISTANCE_RANGE
+from blocks.argument_block import ArgumentBlock
+from blocks.function_block import PrintBlock
+from blocks.port_index import PortIndex
+
+
+def place(block, x, y):
+    # block の始点を (x, y) に動かす
+    block.translate(block.block_start_point.x - x, block.block_start_point.y - y)
+
+
+def make_block(block_type, x, y):
+    block = block_type()
+    block.draw(float(x), float(y))
+    return block
+
+
+@pytest.fixture
+def parent():
+    # next の接続点が格子の境界のすぐ手前に来るように置く
+    block = make_block(PrintBlock, 0, 0)
+    end = block.port_point("next")
+    place(block, block.block_start_point.x + (DISTANCE_RANGE - 1 - end.x),
+          block.block_start_point.y - end.y)
+    return block
+
+
+def test_nearest_across_cell_boundary(parent):
+    index = PortIndex()
+    index.update(parent)
+
+    end = parent.port_point("next")
+    child = make_block(PrintBlock, end.x + 2, end.y)
+    assert index.cell_of(child.block_start_point) != index.cell_of(end)
+
+    assert index.nearest(child) == (parent, "next")
+
+
+def test_nearest_out_of_range(parent):
+    index = PortIndex()
+    index.update(parent)
+
+    end = parent.port_point("next")
+    child = make_block(PrintBlock, end.x + DISTANCE_RANGE, end.y)
+
+    assert index.nearest(child) is None
+
+
+def test_nearest_skips_occupied_port(parent):
+    index = PortIndex()
+    index.update(parent)
+
+    end = parent.port_point("next")
+    child = make_block(PrintBlock, end.x + 1, end.y)
+    other = make_block(PrintBlock, end.x, end.y)
+    parent.attach("next", other)
+
+    assert index.nearest(child) is None
+    # 自分が繋がっている接続点は空いているものとして扱う
+    assert index.nearest(other) == (parent, "next")
+
+
+def test_nearest_exclude(parent):
+    index = PortIndex()
+    index.update(parent)
+
+    end = parent.port_point("next")
+    child = make_block(PrintBlock, end.x + 1, end.y)
+
+    assert index.nearest(child, exclude={parent}) is None
+
+
+def test_nearest_accepts_argument_only_on_elem(parent):
+    index = PortIndex()
+    index.update(parent)
+
+    end = parent.port_point("next")
+    argument = make_block(ArgumentBlock, end.x + 1, end.y)
+    assert index.nearest(argument) is None
+
+    elem = parent.port_point("elem")
+    place(argument, elem.x + 1, elem.y)
+    assert index.nearest(argument) == (parent, "elem")
+
+
+def test_nearest_after_update_and_remove(parent):
+    index = PortIndex()
+    index.update(parent)
+
+    end = parent.port_point("next")
+    child = make_block(PrintBlock, end.x + 1, end.y)
+
+    place(parent, parent.block_start_point.x + 10 * DISTANCE_RANGE, parent.block_start_point.y)
+    assert index.nearest(child) is None  # 更新するまでは古い格子に残る接続点は遠すぎる
+    index.update(parent)
+    place(child, parent.port_point("next").x + 1, parent.port_point("next").y)
+    assert index.nearest(child) == (parent, "next")
+
+    index.remove(parent)
+    assert index.nearest(child) is None
+    assert not index.cells and not index.start_cells
+
+
+def test_nearest_child(parent):
+    index = PortIndex()
+    index.update(parent)
+
+    end = parent.port_point("next")
+    near = make_block(PrintBlock, end.x + 1, end.y)
+    far = make_block(PrintBlock, end.x + 5, end.y)
+    for block in (near, far):
+        index.update(block)
+
+    assert index.nearest_child(parent, "next") is near
+    assert index.nearest_child(parent, "next", exclude={near}) is far
+
+    # 他の Block に繋がっている Block は候補にしない
+    other = make_block(PrintBlock, 500, 500)
+    other.attach("next", near)
+    assert index.nearest_child(parent, "next") is far
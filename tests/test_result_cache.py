@@ -0,0 +1,57 @@
+# coding: utf-8
+
+from result_cache import ResultCache
+
+
+def test_evicts_least_recently_used_by_count():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", "code a", ["1"])
+    cache.put("b", "code b", ["2"])
+
+    # a を使うと, 次に捨てられるのは b になる
+    assert cache.get("a") == ("code a", ["1"])
+    cache.put("c", "code c", ["3"])
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_evicts_by_size():
+    cache = ResultCache(max_entries=10, max_bytes=10)
+    cache.put("a", "aaaa", ["1"])
+    cache.put("b", "bbbb", ["2"])
+    cache.put("c", "cccc", ["3"])
+
+    assert list(cache.entries) == ["b", "c"]
+    assert cache.size == 10
+
+
+def test_oversized_entry_is_not_stored():
+    cache = ResultCache(max_bytes=4)
+    cache.put("a", "too long", [""])
+
+    assert cache.get("a") is None
+    assert cache.size == 0
+
+
+def test_replacing_entry_updates_size():
+    cache = ResultCache()
+    cache.put("a", "code", ["12345"])
+    cache.put("a", "code", ["1"])
+
+    assert cache.size == len("code") + 1
+
+
+def test_key_depends_on_chain_boundaries():
+    assert ResultCache.key(["ab", "c"]) != ResultCache.key(["a", "bc"])
+
+
+def test_disk_store_survives_eviction(tmp_path):
+    cache = ResultCache(max_entries=1, directory=str(tmp_path))
+    cache.put("a", "code a", ["1"])
+    cache.put("b", "code b", ["2"])
+    assert "a" not in cache.entries
+
+    assert cache.get("a") == ("code a", ["1"])
+    assert ResultCache(directory=str(tmp_path)).get("b") == ("code b", ["2"])
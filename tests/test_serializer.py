@@ -0,0 +1,73 @@
+# coding: utf-8
+
+import pytest
+
+pytest.importorskip("kivy")
+
+from blocks.concrete_block import ConcreteBlock
+from blocks.serializer import dump_blocks, load_blocks
+
+PROGRAM = {"blocks": [
+    {"type": "DeclareBlock", "x": 0.0, "y": 0.0, "text": "n", "next": 2, "elem": 1, "nest": None,
+     "breakpoint": False, "id": "a:1"},
+    {"type": "ArgumentBlock", "x": 0.0, "y": 0.0, "text": "3", "next": None, "elem": None, "nest": None,
+     "breakpoint": False, "id": "a:2"},
+    {"type": "IfBlock", "x": 0.0, "y": 0.0, "text": "", "next": None, "elem": 3, "nest": 4,
+     "breakpoint": True, "id": "a:3"},
+    {"type": "ArgumentBlock", "x": 0.0, "y": 0.0, "text": "n > 1", "next": None, "elem": None, "nest": None,
+     "breakpoint": False, "id": "a:4"},
+    {"type": "PrintBlock", "x": 0.0, "y": 0.0, "text": "", "next": None, "elem": 5, "nest": None,
+     "breakpoint": False, "id": "a:5"},
+    {"type": "ArgumentBlock", "x": 0.0, "y": 0.0, "text": "n", "next": None, "elem": None, "nest": None,
+     "breakpoint": False, "id": "a:6"},
+]}
+
+
+def code_of(codes):
+    return "".join(ConcreteBlock.make_chain_code(head, "", 0)[0]
+                   for head in ConcreteBlock.find_heads(codes))
+
+
+def test_round_trip_without_drawing():
+    codes = load_blocks(PROGRAM, draw=False)
+    assert code_of(codes) == "n = 3\nif n > 1:\n    print(n)\n"
+
+    data = dump_blocks(codes)
+    for item, original in zip(data["blocks"], PROGRAM["blocks"]):
+        for key in ("type", "text", "next", "elem", "nest", "breakpoint", "id"):
+            assert item[key] == original[key]
+
+
+def test_round_trip_keeps_positions():
+    codes = load_blocks(PROGRAM)
+    codes[0].move(-100, 50)  # chain ごと (100, -50) へ動かす
+
+    data = dump_blocks(codes)
+    again = load_blocks(data)
+
+    assert dump_blocks(again) == data
+    assert code_of(again) == code_of(codes)
+    for block, copy in zip(codes, again):
+        assert tuple(block.block_start_point.point) == tuple(copy.block_start_point.point)
+        assert tuple(block.block_end_point.point) == tuple(copy.block_end_point.point)
+
+
+def test_dump_drops_links_outside_codes():
+    codes = load_blocks(PROGRAM, draw=False)
+
+    data = dump_blocks(codes[2:])
+    assert data["blocks"][0]["elem"] == 1
+    assert data["blocks"][0]["nest"] == 2
+
+    data = dump_blocks(codes[:1])
+    assert data["blocks"][0]["next"] is None
+    assert data["blocks"][0]["elem"] is None
+
+
+def test_load_with_offset():
+    codes = load_blocks(PROGRAM)
+    moved = load_blocks(dump_blocks(codes), dx=30, dy=-30)
+
+    for block, copy in zip(codes, moved):
+        assert copy.block_start_point.x == block.block_start_point.x + 30
+        assert copy.block_start_point.y == block.block_start_point.y - 30
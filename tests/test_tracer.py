@@ -0,0 +1,104 @@
+# coding: utf-8
+
+import queue
+
+import pytest
+
+from tracer import Tracer
+
+SCRIPT = "total = 0\nfor i in range(3):\n    total += i\nprint(total)\n"
+
+
+def run(tracer):
+    # on_pause と on_finish を queue で受け取れるようにして開始する
+    events = queue.Queue()
+    tracer.on_pause = lambda line: events.put(("pause", line))
+    tracer.on_finish = lambda output, hits, times: events.put(("finish", output))
+    tracer.start()
+    return events
+
+
+def test_counts_hits_per_line():
+    tracer = Tracer(SCRIPT)
+    events = run(tracer)
+
+    assert events.get(timeout=5) == ("finish", "3\n")
+    assert tracer.hits[1] == 1 and tracer.hits[3] == 3 and tracer.hits[4] == 1
+    assert set(tracer.times) <= set(tracer.hits)
+
+
+def test_pauses_at_breakpoints_and_resumes():
+    tracer = Tracer(SCRIPT, breakpoints=[3])
+    events = run(tracer)
+
+    for _ in range(3):
+        assert events.get(timeout=5) == ("pause", 3)
+        assert tracer.paused
+        tracer.resume()
+    assert events.get(timeout=5) == ("finish", "3\n")
+
+
+def test_step_pauses_on_every_line():
+    tracer = Tracer(SCRIPT, stepping=True)
+    events = run(tracer)
+
+    lines = []
+    while True:
+        event, value = events.get(timeout=5)
+        if event == "finish":
+            break
+        lines.append(value)
+        tracer.step()
+
+    assert lines[:4] == [1, 2, 3, 2]
+    assert lines[-1] == 4
+
+
+def test_stop_while_paused():
+    tracer = Tracer(SCRIPT, breakpoints=[2])
+    events = run(tracer)
+
+    assert events.get(timeout=5) == ("pause", 2)
+    tracer.stop()
+    assert events.get(timeout=5) == ("finish", "Stopped\n")
+
+
+def test_line_table_maps_generated_lines_to_blocks():
+    pytest.importorskip("kivy")
+    from blocks.concrete_block import ConcreteBlock
+    from blocks.serializer import load_blocks
+
+    codes = load_blocks({"blocks": [
+        {"type": "DeclareBlock", "x": 0, "y": 0, "text": "n", "next": 2, "elem": 1, "nest": None},
+        {"type": "ArgumentBlock", "x": 0, "y": 0, "text": "2", "next": None, "elem": None, "nest": None},
+        {"type": "IfBlock", "x": 0, "y": 0, "text": "", "next": None, "elem": 3, "nest": 4},
+        {"type": "ArgumentBlock", "x": 0, "y": 0, "text": "n", "next": None, "elem": None, "nest": None},
+        {"type": "PrintBlock", "x": 0, "y": 0, "text": "", "next": None, "elem": 5, "nest": None},
+        {"type": "ArgumentBlock", "x": 0, "y": 0, "text": "n", "next": None, "elem": None, "nest": None},
+    ]}, draw=False)
+
+    ConcreteBlock.line_table = {}
+    try:
+        script = ConcreteBlock.make_chain_code(codes[0], "", 0)[0]
+        line_table = ConcreteBlock.line_table
+    finally:
+        ConcreteBlock.line_table = None
+
+    assert script == "n = 2\nif n:\n    print(n)\n"
+    assert line_table == {1: codes[0], 2: codes[2], 3: codes[4]}
+
+    # Block の breakpoint は対応する行で止まる
+    tracer = Tracer(script, breakpoints=[line for line, block in line_table.items() if block is codes[4]])
+    events = run(tracer)
+    assert events.get(timeout=5) == ("pause", 3)
+    tracer.resume()
+    assert events.get(timeout=5) == ("finish", "2\n")
+
+
+def test_traceback_starts_at_the_program():
+    tracer = Tracer("x = 1\nraise ValueError(x)\n")
+    events = run(tracer)
+
+    event, output = events.get(timeout=5)
+    assert output.startswith('Traceback (most recent call last):\n  File "<vpl>", line 2')
+    assert "tracer.py" not in output and "executor.py" not in output
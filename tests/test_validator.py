@@ -0,0 +1,68 @@
+# coding: utf-8
+
+import pytest
+
+pytest.importorskip("kivy")
+
+from blocks.argument_block import ArgumentBlock
+from blocks.call_block import CallBlock
+from blocks.declare_block import DeclareBlock
+from blocks.function_block import PrintBlock
+from blocks.nest_block import ClassBlock, DefineBlock, IfBlock
+from blocks.validator import Validator
+
+
+def with_elem(parent_type, text):
+    parent = parent_type()
+    if parent.text_field is not None:
+        setattr(parent, parent.text_field, "name")
+    elem = ArgumentBlock()
+    elem.code = text
+    parent.elem_block = elem
+    elem.back_block = parent
+    return parent, elem
+
+
+# 親 Block ごとに, 生成される code として正しい引数と誤った引数
+ELEM_CASES = [
+    (PrintBlock, ["'a', 'b', sep='-'", "x, end=''", "*items", ""], ["1 +", "sep='-', 'a'"]),
+    (DeclareBlock, ["1, 2", "[i for i in range(3)]", "lambda: 0"], ["1 +", "pass"]),
+    (IfBlock, ["x > 1 and y", "not done"], ["x =", "else"]),
+    (ClassBlock, ["Foo", "Foo(Base)", "Foo(metaclass=Meta)"], ["Foo(", "1 + 2"]),
+    (DefineBlock, ["a, b=1, *args, **kwargs", ""], ["1", "a b"]),
+]
+
+
+@pytest.mark.parametrize("parent_type, valid, invalid", ELEM_CASES)
+def test_elem_syntax_follows_parent_template(parent_type, valid, invalid):
+    for text in valid:
+        _, elem = with_elem(parent_type, text)
+        assert elem.validate() == [], (parent_type.__name__, text)
+    for text in invalid:
+        _, elem = with_elem(parent_type, text)
+        problems = elem.validate()
+        assert len(problems) == 1 and "is not valid Python" in problems[0], (parent_type.__name__, text)
+
+
+@pytest.mark.parametrize("parent_type", [DeclareBlock, IfBlock, ClassBlock])
+def test_empty_elem_rejected_where_value_required(parent_type):
+    _, elem = with_elem(parent_type, " ")
+    assert elem.validate() == ["Elem is empty"]
+
+
+def test_unconnected_elem():
+    elem = ArgumentBlock()
+    elem.code = "1"
+    assert elem.validate() == ["Elem is not connected to any block"]
+
+
+def test_validator_rechecks_only_dirty_blocks():
+    call = CallBlock()
+    validator = Validator()
+
+    assert Validator.format(validator.validate([call])) == "CallBlock: Call has no function name"
+
+    call.name = "main"
+    assert validator.validate([call])  # dirty でなければ前回の結果を使う
+    call.dirty = True
+    assert validator.validate([call]) == []
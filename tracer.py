@@ -0,0 +1,114 @@
+# coding: utf-8
+
+import io
+import sys
+import time
+import threading
+from collections import Counter, defaultdict
+
+from executor import compile_script, format_error
+
+FILENAME = "<vpl>"  # trace 対象の code の filename
+
+
+class StopTrace(Exception):
+    pass
+
+
+class Tracer(threading.Thread):
+    # 生成した code を別 thread で行ごとに trace しながら実行する
+    def __init__(self, script, breakpoints=(), stepping=False, on_pause=None, on_finish=None):
+        super(Tracer, self).__init__(daemon=True)
+
+        self.script = script
+        self.breakpoints = set(breakpoints)  # 停止する行番号
+        self.stepping = stepping  # 1 行ずつ停止するか
+
+        self.on_pause = on_pause  # on_pause(行番号)
+        self.on_finish = on_finish  # on_finish(出力, 実行回数, 累積時間)
+
+        self.hits = Counter()  # 行番号 -> 実行回数
+        self.times = defaultdict(float)  # 行番号 -> 累積時間 [s]
+
+        self.paused = False
+        self.stopped = False
+        self.resume_event = threading.Event()
+
+        self.last_line = None
+        self.last_time = None
+
+    def run(self):
+        output = io.StringIO()
+
+        def print_to_output(*args, **kwargs):
+            kwargs.setdefault("file", output)
+            print(*args, **kwargs)
+
+        error = ""
+        sys.settrace(self.trace_call)
+        try:
+            exec(compile_script(self.script, FILENAME),
+                 {"__name__": "__main__", "print": print_to_output})
+        except StopTrace:
+            error = "Stopped\n"
+        except:
+            error = format_error(__file__)
+        finally:
+            sys.settrace(None)
+            self.account(time.perf_counter())
+
+        if self.on_finish is not None:
+            self.on_finish(output.getvalue() + error, self.hits, self.times)
+
+    def trace_call(self, frame, event, arg):
+        # 生成した code 以外の frame は trace しない
+        if frame.f_code.co_filename != FILENAME:
+            return None
+        return self.trace_line
+
+    def trace_line(self, frame, event, arg):
+        now = time.perf_counter()
+        if event == "line":
+            self.account(now)
+            line = frame.f_lineno
+            self.hits[line] += 1
+            self.last_line = line
+
+            if self.stepping or line in self.breakpoints:
+                self.pause(line)
+                now = time.perf_counter()
+            self.last_time = now
+
+            if self.stopped:
+                raise StopTrace()
+        elif event == "return":
+            self.account(now)
+            self.last_line = None
+
+        return self.trace_line
+
+    def account(self, now):
+        # 直前の行にかかった時間を加算する
+        if self.last_line is not None:
+            self.times[self.last_line] += now - self.last_time
+
+    def pause(self, line):
+        self.paused = True
+        if self.on_pause is not None:
+            self.on_pause(line)
+
+        self.resume_event.wait()
+        self.resume_event.clear()
+        self.paused = False
+
+    def step(self):
+        self.stepping = True
+        self.resume_event.set()
+
+    def resume(self):
+        self.stepping = False
+        self.resume_event.set()
+
+    def stop(self):
+        self.stopped = True
+        self.resume_event.set()